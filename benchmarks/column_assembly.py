@@ -0,0 +1,90 @@
+"""
+Benchmark how the cost of assembling generated columns into a table scales with the number of columns.
+
+Compares the previous approach (growing a DataFrame one column at a time) with generate_data_columns, which
+collects typed arrays and builds the table once.
+
+Usage:
+    python benchmarks/column_assembly.py [--rows 65536] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from generate_csv import generate_data_columns  # noqa: E402
+from generator import IntGenerator, StringGenerator  # noqa: E402
+from random_streams import RandomStreams  # noqa: E402
+
+COLUMN_COUNTS = [10, 25, 50, 100, 200, 400]
+
+
+def create_generators(num_columns: int) -> dict:
+    """
+    Create a mix of integer and value set generators, bound to a fixed seed.
+
+    Args:
+        num_columns (int): The number of generators to create.
+
+    Returns:
+        dict: Bound generators by concept ID.
+    """
+    streams = RandomStreams(seed=0)
+    generators = {}
+    for i in range(num_columns):
+        if i % 2:
+            generator = IntGenerator(min_value=0, max_value=300)
+        else:
+            generator = StringGenerator(value_set={'PB', 'OPB', 'M', 'F'})
+        generators[f'concept_{i}'] = generator.bind(streams, f'concept_{i}')
+    return generators
+
+
+def assemble_incrementally(columns: dict) -> pd.DataFrame:
+    output_data = pd.DataFrame()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+        for concept_id, values in columns.items():
+            output_data[concept_id] = pd.Series(values)
+    return output_data
+
+
+def assemble_once(columns: dict) -> pd.DataFrame:
+    return pd.DataFrame(columns, copy=False)
+
+
+def best_of(repeat: int, function, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark column assembly.')
+    parser.add_argument('--rows', type=int, default=65536, help='Rows per generated chunk.')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per measurement, the best is reported.')
+    args = parser.parse_args()
+
+    print(f"{'columns':>8} {'generate [s]':>13} {'incremental [s]':>16} {'single [s]':>11} {'speedup':>8}")
+    for num_columns in COLUMN_COUNTS:
+        generators = create_generators(num_columns)
+        start = time.perf_counter()
+        columns = generate_data_columns(generators, args.rows)
+        generate_time = time.perf_counter() - start
+
+        incremental = best_of(args.repeat, assemble_incrementally, columns)
+        single = best_of(args.repeat, assemble_once, columns)
+        print(f"{num_columns:>8} {generate_time:>13.3f} {incremental:>16.4f} {single:>11.4f} "
+              f"{incremental / single:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
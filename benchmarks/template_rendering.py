@@ -0,0 +1,70 @@
+"""
+Benchmark rendering rows to serialized CDA documents with the XSLT transformation and with the compiled template.
+
+Both engines render the same rows, read from a CSV file written by a run with --write-csv, to the bytes that are
+written to the output files. tests/test_cda_template.py checks that the documents are identical.
+
+Usage:
+    python src/main.py --number 2000 --xlsx resources/CDAVariables_short.xlsx --xslt resources/EmergencyNote.xslt
+        --output output --write-csv
+    python benchmarks/template_rendering.py --csv output/data.csv --xslt resources/EmergencyNote.xslt
+        [--rows 1000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+from itertools import islice
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from cda_template import CompiledTemplate  # noqa: E402
+from csv_to_cda import csv_to_dict, load_xslt, render_cda  # noqa: E402
+
+
+def render_with_xslt(rows: list, xslt_transform: etree.XSLT, pretty_print: bool) -> None:
+    for row in rows:
+        etree.tostring(render_cda(row, xslt_transform), pretty_print=pretty_print, encoding='UTF-8')
+
+
+def render_compiled(rows: list, template: CompiledTemplate, pretty_print: bool) -> None:
+    for row in rows:
+        template.render(row, pretty_print)
+
+
+def best_of(repeat: int, function, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the CDA rendering engines.')
+    parser.add_argument('--csv', type=str, required=True, help='Filepath to a CSV file written with --write-csv.')
+    parser.add_argument('--xslt', type=str, required=True, help='Filepath to the input XSLT file.')
+    parser.add_argument('--rows', type=int, default=1000, help='Number of rows to render.')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per measurement, the best is reported.')
+    args = parser.parse_args()
+
+    rows = list(islice(csv_to_dict(args.csv), args.rows))
+    xslt_transform = load_xslt(args.xslt)
+    start = time.perf_counter()
+    template = CompiledTemplate.from_file(args.xslt)
+    print(f"Compiled the template in {time.perf_counter() - start:.3f} s, "
+          f"{template.fallbacks} constructs are rendered with XSLT.")
+
+    print(f"{'pretty_print':>12} {'xslt [docs/s]':>14} {'compiled [docs/s]':>18} {'speedup':>8}")
+    for pretty_print in (True, False):
+        xslt = best_of(args.repeat, render_with_xslt, rows, xslt_transform, pretty_print)
+        compiled = best_of(args.repeat, render_compiled, rows, template, pretty_print)
+        print(f"{str(pretty_print):>12} {len(rows) / xslt:>14.0f} {len(rows) / compiled:>18.0f} "
+              f"{xslt / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import queue
+import threading
+from typing import List, Optional, Tuple
+
+from csv_to_cda import Document
+from output_sinks import OutputSink
+from stage_timings import StageTimings
+
+# Number of documents handed to the writer thread at once
+DEFAULT_WRITE_BATCH_SIZE = 64
+# Number of batches that may wait for the writer thread before the producer blocks
+DEFAULT_QUEUE_SIZE = 8
+
+
+class BackgroundWriter(OutputSink):
+    """
+    Writes documents to another sink in a background thread, so transforming and writing overlap.
+
+    Documents are collected in batches of batch_size and passed through a queue of at most queue_size batches.
+    The producer only waits on the writer when the queue is full. If fsync_every is set, the writer makes the
+    written documents durable after every fsync_every documents and at the end, instead of after each one.
+
+    Time spent is added to the timings as 'waiting for writer' in the producer and 'writing' and 'syncing' in
+    the writer thread. Stages the sink measures itself, like validation, are not counted as writing. An error of
+    the writer thread is raised in the producer by the next write or close.
+    """
+
+    def __init__(self, sink: OutputSink, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_WRITE_BATCH_SIZE, fsync_every: Optional[int] = None,
+                 timings: Optional[StageTimings] = None) -> None:
+        """
+        Initialize the BackgroundWriter and start its thread.
+
+        Args:
+            sink (OutputSink): The sink the documents are written to. It is closed by close.
+            queue_size (int, optional): Maximum number of batches waiting. Defaults to DEFAULT_QUEUE_SIZE.
+            batch_size (int, optional): Number of documents per batch. Defaults to DEFAULT_WRITE_BATCH_SIZE.
+            fsync_every (int, optional): Number of documents after which written documents are synced to disk.
+                                         Defaults to never syncing.
+            timings (StageTimings, optional): Timings to add the time spent to.
+
+        Raises:
+            ValueError: If queue_size or batch_size is not positive.
+        """
+        if queue_size < 1 or batch_size < 1:
+            raise ValueError('The background writer needs a positive queue and batch size')
+        self.sink = sink
+        self.batch_size = batch_size
+        self.fsync_every = fsync_every
+        self.timings = timings or StageTimings()
+        self._batch: List[Tuple[int, Document]] = []
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._error: Optional[BaseException] = None
+        self._error_raised = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='cda-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, index: int, document: Document) -> None:
+        self._raise_error()
+        self._batch.append((index, document))
+        if len(self._batch) >= self.batch_size:
+            self._put(self._batch)
+            self._batch = []
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._batch and self._error is None:
+                self._put(self._batch)
+            self._batch = []
+        finally:
+            self._put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def _put(self, batch: Optional[List[Tuple[int, Document]]]) -> None:
+        with self.timings.measure('waiting for writer'):
+            self._queue.put(batch)
+
+    def _raise_error(self) -> None:
+        if self._error is not None and not self._error_raised:
+            self._error_raised = True
+            raise self._error
+
+    def _run(self) -> None:
+        unsynced = 0
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if self._error is not None:
+                # Keep draining, so that the producer never blocks on a writer that has failed
+                continue
+            try:
+                with self.timings.measure('writing'):
+                    for index, document in batch:
+                        self.sink.write(index, document)
+                unsynced += len(batch)
+                if self.fsync_every and unsynced >= self.fsync_every:
+                    with self.timings.measure('syncing'):
+                        self.sink.sync()
+                    unsynced = 0
+            except BaseException as e:
+                self._error = e
+        try:
+            if self._error is None and self.fsync_every and unsynced:
+                with self.timings.measure('syncing'):
+                    self.sink.sync()
+        except BaseException as e:
+            self._error = e
+        finally:
+            try:
+                with self.timings.measure('writing'):
+                    self.sink.close()
+            except BaseException as e:
+                self._error = self._error or e
@@ -0,0 +1,841 @@
+import copy
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from lxml import etree
+
+from csv_to_cda import BLANK_CHARACTERS, add_prolog, dict_to_xml
+
+XSLT_NAMESPACE = 'http://www.w3.org/1999/XSL/Transform'
+_XSL = f'{{{XSLT_NAMESPACE}}}'
+
+# libxml2 indents with two spaces per level, up to 60 characters
+_INDENT = '  '
+_MAX_INDENT_LEVEL = 30
+
+_NAME_PATTERN = re.compile(r'[A-Za-z_][\w.-]*\Z')
+_TEST_TOKEN_PATTERN = re.compile(
+    r"""\s*(?:(?P<operator>or|and)\b|(?P<field>[A-Za-z_][\w.-]*)\s*(?P<comparison>!?=)\s*"""
+    r"""(?:'(?P<single>[^']*)'|"(?P<double>[^"]*)"))\s*""")
+_ATTRIBUTE_VALUE_TEMPLATE_PATTERN = re.compile(r'((?:[^{}]|\{\{|\}\})+)|\{([^{}]*)\}|(.)')
+_NON_ASCII_PATTERN = re.compile(r'[^\x00-\x7f]')
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\r': '&#13;'})
+_ATTRIBUTE_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+                                    '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+
+# Instructions that never add attributes to the enclosing element, and those that do only through their children
+_ATTRIBUTE_FREE_INSTRUCTIONS = {f'{_XSL}{name}' for name in ('value-of', 'text', 'comment', 'processing-instruction',
+                                                               'element', 'number', 'message')}
+_CONTROL_INSTRUCTIONS = {f'{_XSL}{name}' for name in ('for-each', 'if', 'choose', 'when', 'otherwise', 'variable',
+                                                       'fallback', 'sort')}
+
+Row = Dict[str, str]
+Test = Callable[[Row], bool]
+
+
+class _Unsupported(Exception):
+    """Raised while compiling an XSLT construct the compiled template cannot render itself."""
+
+
+class _RowContext:
+    """The row being rendered, with its raw XML tree built on first use by a fallback."""
+
+    def __init__(self, row: Row) -> None:
+        self.row = row
+        self._raw_xml = None
+
+    @property
+    def raw_xml(self) -> etree._Element:
+        if self._raw_xml is None:
+            self._raw_xml = dict_to_xml(self.row)
+        return self._raw_xml
+
+
+def _escape_attribute(value: str) -> str:
+    # Without an encoding in the result document, libxml2 writes other than ASCII characters of attribute values as
+    # character references, while text is written as UTF-8
+    value = value.translate(_ATTRIBUTE_ESCAPES)
+    if not value.isascii():
+        value = _NON_ASCII_PATTERN.sub(lambda match: f'&#x{ord(match.group()):X};', value)
+    return value
+
+
+def _indent(level: int) -> str:
+    return _INDENT * min(level, _MAX_INDENT_LEVEL)
+
+
+def _strip_blank_text(content: list) -> list:
+    """
+    Drop ignorable whitespace from the content of an element, as strip_comments_and_blank_text does.
+
+    Args:
+        content (list): Text strings, with adjacent strings merged, and child nodes.
+
+    Returns:
+        list: The content without whitespace-only text before the first other text, if there are child nodes.
+    """
+    if all(isinstance(item, str) for item in content):
+        return content
+    stripped = []
+    mixed = False
+    for item in content:
+        if not mixed and isinstance(item, str) and item:
+            if not item.strip(BLANK_CHARACTERS):
+                continue
+            mixed = True
+        stripped.append(item)
+    return stripped
+
+
+class _Element:
+    """An element of a rendered document, serialized like libxml2 serializes the element tree."""
+
+    __slots__ = ('start', 'qname', 'attributes', 'content')
+
+    def __init__(self, start: str, qname: str, attributes: Dict[str, str], content: list) -> None:
+        self.start = start
+        self.qname = qname
+        self.attributes = attributes
+        self.content = content
+
+    def serialize(self, level: int, pretty_print: bool, out: List[str]) -> None:
+        out.append(self.start)
+        for name, value in self.attributes.items():
+            out.append(f' {name}="{_escape_attribute(value)}"')
+        content = _strip_blank_text(self.content)
+        if not content:
+            out.append('/>')
+            return
+        out.append('>')
+        # libxml2 stops indenting within elements that contain text
+        indent = pretty_print and not any(isinstance(item, str) for item in content)
+        if indent:
+            out.append('\n')
+        for item in content:
+            if isinstance(item, str):
+                out.append(item.translate(_TEXT_ESCAPES))
+                continue
+            if indent:
+                out.append(_indent(level + 1))
+            item.serialize(level + 1, indent, out)
+            if indent:
+                out.append('\n')
+        if indent:
+            out.append(_indent(level))
+        out.append(f'</{self.qname}>')
+
+
+class _Markup:
+    """A node of a rendered document that is serialized the same way at every position."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def serialize(self, level: int, pretty_print: bool, out: List[str]) -> None:
+        out.append(self.text)
+
+
+class _StaticElement:
+    """A literal element of the template without any row-dependent part, serialized once per position."""
+
+    def __init__(self, element: _Element) -> None:
+        self.element = element
+        self._serialized: Dict[Tuple[int, bool], str] = {}
+
+    def serialize(self, level: int, pretty_print: bool, out: List[str]) -> None:
+        key = (level, pretty_print)
+        if key not in self._serialized:
+            parts = []
+            self.element.serialize(level, pretty_print, parts)
+            self._serialized[key] = ''.join(parts)
+        out.append(self._serialized[key])
+
+
+def _append_text(content: list, text: str) -> None:
+    # Adjacent text is a single text node in the result tree
+    if not text:
+        return
+    if content and isinstance(content[-1], str):
+        content[-1] += text
+    else:
+        content.append(text)
+
+
+class _Instruction:
+    """
+    A compiled construct of the template.
+
+    Attributes:
+        attributes (bool): Whether the construct may add attributes to the enclosing element.
+        content (bool): Whether the construct may add text or nodes to the enclosing element.
+        static (bool): Whether the output of the construct is the same for every row.
+    """
+    attributes = False
+    content = True
+    static = True
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        raise NotImplementedError
+
+
+class _Text(_Instruction):
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        _append_text(content, self.text)
+
+
+class _ValueOf(_Instruction):
+    static = False
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        _append_text(content, context.row.get(self.field, ''))
+
+
+class _Attribute(_Instruction):
+    attributes = True
+    content = False
+
+    def __init__(self, name: str, parts: List[Union[str, _ValueOf]]) -> None:
+        self.name = name
+        self.parts = parts
+        self.static = all(isinstance(part, str) for part in parts)
+
+    def value(self, context: _RowContext) -> str:
+        return ''.join(part if isinstance(part, str) else context.row.get(part.field, '') for part in self.parts)
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        attributes[self.name] = self.value(context)
+
+
+class _Choose(_Instruction):
+    static = False
+
+    def __init__(self, branches: List[Tuple[Optional[Test], List[_Instruction]]]) -> None:
+        # A branch without test is the xsl:otherwise branch
+        self.branches = branches
+        self.attributes = any(node.attributes for _, body in branches for node in body)
+        self.content = any(node.content for _, body in branches for node in body)
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        for test, body in self.branches:
+            if test is None or test(context.row):
+                for node in body:
+                    node.emit(context, attributes, content)
+                return
+
+
+class _LiteralElement(_Instruction):
+    """
+    A literal result element of the template.
+
+    An element whose content can only be child elements, at least one of them unconditional, is indented the
+    same way for every row. It is compiled to a skeleton per indentation level: a list of pre-serialized
+    strings, with slots for attribute values, for branches and for children of a varying shape, which are
+    filled for every row. Other elements are rendered node by node.
+    """
+    static = False
+
+    def __init__(self, start: str, qname: str, attributes: Dict[str, str], body: List[_Instruction]) -> None:
+        self.start = start
+        self.qname = qname
+        self.attributes_template = attributes
+        self.body = body
+        children = [node for node in body if node.content]
+        self.fixed = all(_only_elements(node) for node in children) and (
+            not children or any(isinstance(node, (_StaticNode, _LiteralElement)) for node in children))
+        # Elements with only text content and fixed attributes are either empty or contain that text
+        self.text_only = all(isinstance(node, (_Text, _ValueOf)) for node in body)
+        self._skeletons: Dict[Tuple[int, bool], list] = {}
+
+    def build(self, context: _RowContext) -> _Element:
+        attributes = dict(self.attributes_template)
+        content = []
+        for node in self.body:
+            node.emit(context, attributes, content)
+        return _Element(self.start, self.qname, attributes, content)
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        content.append(_Filled(self, context) if self.fixed else self.build(context))
+
+    def serialize(self, context: _RowContext, level: int, pretty_print: bool, out: List[str]) -> None:
+        """
+        Render and serialize the element for a row.
+
+        Args:
+            context (_RowContext): The row.
+            level (int): The indentation level of the element.
+            pretty_print (bool): Flag to indicate whether to indent the element.
+            out (List[str]): The serialized parts of the document, the element's parts are appended.
+        """
+        if not self.fixed:
+            self.build(context).serialize(level, pretty_print, out)
+            return
+        key = (level, pretty_print)
+        if key not in self._skeletons:
+            self._skeletons[key] = self._compile_skeleton(level, pretty_print)
+        _fill(self._skeletons[key], context, out)
+
+    def _compile_skeleton(self, level: int, pretty_print: bool) -> list:
+        parts = [self.start]
+        setters = [node for node in self.body if node.attributes]
+        if all(isinstance(node, _Attribute) for node in setters):
+            # Attributes are always set in the same order, only their values vary
+            values = {name: value for name, value in self.attributes_template.items()}
+            values.update((node.name, node) for node in setters)
+            for name, value in values.items():
+                parts.append(f' {name}="')
+                if isinstance(value, _Attribute) and not value.static:
+                    parts.append(_attribute_slot(value))
+                else:
+                    text = value if isinstance(value, str) else ''.join(value.parts)
+                    parts.append(_escape_attribute(text))
+                parts.append('"')
+        else:
+            parts.append(self._attributes_slot(setters))
+
+        if not any(node.content for node in self.body):
+            parts.append('/>')
+            return _join_strings(parts)
+        parts.append('>\n' if pretty_print else '>')
+        parts.extend(_compile_children(self.body, level + 1, pretty_print))
+        if pretty_print:
+            parts.append(_indent(level))
+        parts.append(f'</{self.qname}>')
+        return _join_strings(parts)
+
+    def _attributes_slot(self, setters: List[_Instruction]) -> Callable[[_RowContext, List[str]], None]:
+        def fill(context: _RowContext, out: List[str]) -> None:
+            attributes = dict(self.attributes_template)
+            for node in setters:
+                node.emit(context, attributes, [])
+            for name, value in attributes.items():
+                out.append(f' {name}="{_escape_attribute(value)}"')
+        return fill
+
+
+def _only_elements(node: _Instruction) -> bool:
+    # Whether a construct adds nothing but elements to the content, and no attributes along with them
+    if isinstance(node, (_StaticNode, _LiteralElement)):
+        return True
+    if isinstance(node, _Choose):
+        return not node.attributes and all(_only_elements(child) for _, body in node.branches for child in body)
+    return False
+
+
+def _compile_children(body: List[_Instruction], level: int, pretty_print: bool) -> list:
+    """
+    Compile the skeleton of child elements, each on a line of its own if the document is indented.
+
+    Args:
+        body (List[_Instruction]): Constructs adding only elements to the content, or only attributes.
+        level (int): The indentation level of the children.
+        pretty_print (bool): Flag to indicate whether to indent the children.
+
+    Returns:
+        list: The skeleton of the children.
+    """
+    parts = []
+    for child in body:
+        if not child.content:
+            continue
+        if isinstance(child, _Choose):
+            parts.append(_branch_slot(child, level, pretty_print))
+            continue
+        if pretty_print:
+            parts.append(_indent(level))
+        if isinstance(child, _StaticNode):
+            child.node.serialize(level, pretty_print, parts)
+        elif child.fixed:
+            parts.extend(child._compile_skeleton(level, pretty_print))
+        elif child.text_only:
+            parts.append(_text_slot(child))
+        else:
+            parts.append(_child_slot(child, level, pretty_print))
+        if pretty_print:
+            parts.append('\n')
+    return _join_strings(parts)
+
+
+def _fill(skeleton: list, context: _RowContext, out: List[str]) -> None:
+    for part in skeleton:
+        if part.__class__ is str:
+            out.append(part)
+        else:
+            part(context, out)
+
+
+class _Filled:
+    """A literal element of a fixed shape in the content of another element, filled with a row."""
+
+    __slots__ = ('element', 'context')
+
+    def __init__(self, element: _LiteralElement, context: _RowContext) -> None:
+        self.element = element
+        self.context = context
+
+    def serialize(self, level: int, pretty_print: bool, out: List[str]) -> None:
+        self.element.serialize(self.context, level, pretty_print, out)
+
+
+def _attribute_slot(attribute: _Attribute) -> Callable[[_RowContext, List[str]], None]:
+    if len(attribute.parts) == 1:
+        field = attribute.parts[0].field
+
+        def fill(context: _RowContext, out: List[str]) -> None:
+            out.append(_escape_attribute(context.row.get(field, '')))
+    else:
+        def fill(context: _RowContext, out: List[str]) -> None:
+            out.append(_escape_attribute(attribute.value(context)))
+    return fill
+
+
+def _text_slot(element: _LiteralElement) -> Callable[[_RowContext, List[str]], None]:
+    start = element.start + ''.join(f' {name}="{_escape_attribute(value)}"'
+                                    for name, value in element.attributes_template.items())
+    end = f'</{element.qname}>'
+    body = element.body
+
+    def fill(context: _RowContext, out: List[str]) -> None:
+        text = ''.join(node.text if isinstance(node, _Text) else context.row.get(node.field, '') for node in body)
+        if text:
+            out.append(f'{start}>{text.translate(_TEXT_ESCAPES)}{end}')
+        else:
+            out.append(f'{start}/>')
+    return fill
+
+
+def _branch_slot(choose: _Choose, level: int, pretty_print: bool) -> Callable[[_RowContext, List[str]], None]:
+    branches = [(test, _compile_children(body, level, pretty_print)) for test, body in choose.branches]
+
+    def fill(context: _RowContext, out: List[str]) -> None:
+        for test, skeleton in branches:
+            if test is None or test(context.row):
+                _fill(skeleton, context, out)
+                return
+    return fill
+
+
+def _child_slot(child: _LiteralElement, level: int, pretty_print: bool) -> Callable[[_RowContext, List[str]], None]:
+    def fill(context: _RowContext, out: List[str]) -> None:
+        child.build(context).serialize(level, pretty_print, out)
+    return fill
+
+
+def _join_strings(parts: list) -> list:
+    # Adjacent strings of a skeleton are joined, so that only slots separate them
+    joined = []
+    for part in parts:
+        if part.__class__ is str and joined and joined[-1].__class__ is str:
+            joined[-1] += part
+        else:
+            joined.append(part)
+    return joined
+
+
+class _StaticNode(_Instruction):
+    def __init__(self, node: _StaticElement) -> None:
+        self.node = node
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        content.append(self.node)
+
+
+class _Fallback(_Instruction):
+    """A construct the compiled template cannot render, transformed with XSLT for every row."""
+    static = False
+
+    def __init__(self, instruction: etree._Element, match: str, namespaces: Dict[Optional[str], str]) -> None:
+        """
+        Build a stylesheet that applies only this construct, within a wrapper element. It is compiled the first
+        time a row reaches the construct, so that setting up a template does not pay for constructs never used.
+
+        Args:
+            instruction (lxml.etree._Element): The construct in the template.
+            match (str): The match pattern of the template.
+            namespaces (Dict[Optional[str], str]): The namespaces declared in the document at this position.
+        """
+        # Namespaces in scope are declared, as prefixes may also be used in QNames within attribute values
+        stylesheet = etree.Element(f'{_XSL}stylesheet', version='1.0', nsmap=instruction.nsmap)
+        template = etree.SubElement(stylesheet, f'{_XSL}template', match=match)
+        wrapper = etree.SubElement(template, 'fragment')
+        fragment = copy.deepcopy(instruction)
+        fragment.tail = None
+        wrapper.append(fragment)
+        self.stylesheet = stylesheet
+        self.transform: Optional[etree.XSLT] = None
+        self.namespaces = namespaces
+        self.attributes = _may_add_attributes(instruction)
+        self.content = instruction.tag != f'{_XSL}attribute'
+
+    def emit(self, context: _RowContext, attributes: Dict[str, str], content: list) -> None:
+        if self.transform is None:
+            self.transform = etree.XSLT(self.stylesheet)
+        wrapper = self.transform(context.raw_xml).getroot()
+        for name, value in wrapper.attrib.items():
+            attributes[_attribute_name(wrapper, name)] = value
+        etree.strip_tags(wrapper, etree.Comment)
+        _append_text(content, wrapper.text or '')
+        for node in wrapper:
+            if isinstance(node, etree._Element) and isinstance(node.tag, str):
+                content.append(_convert_element(node, self.namespaces))
+            else:
+                content.append(_Markup(etree.tostring(node, encoding='unicode', with_tail=False)))
+            _append_text(content, node.tail or '')
+
+
+def _may_add_attributes(node: etree._Element) -> bool:
+    """
+    Check whether a construct of the template may add attributes to the element it is in.
+
+    Args:
+        node (lxml.etree._Element): The construct in the template.
+
+    Returns:
+        bool: False if the construct cannot add attributes, True if it may.
+    """
+    if not node.tag.startswith(_XSL) or node.tag in _ATTRIBUTE_FREE_INSTRUCTIONS:
+        return False
+    if node.tag == f'{_XSL}attribute' or node.tag not in _CONTROL_INSTRUCTIONS:
+        return True
+    return any(_may_add_attributes(child) for child in node if isinstance(child.tag, str))
+
+
+def _attribute_name(element: etree._Element, name: str) -> str:
+    """
+    Get the prefixed name of an attribute, e.g. 'xsi:type' for '{http://www.w3.org/2001/XMLSchema-instance}type'.
+
+    Args:
+        element (lxml.etree._Element): The element of the attribute, for its namespace prefixes.
+        name (str): The attribute name in lxml's '{namespace}local' notation.
+
+    Returns:
+        str: The name as serialized.
+
+    Raises:
+        _Unsupported: If no prefix is declared for the namespace of the attribute.
+    """
+    if not name.startswith('{'):
+        return name
+    namespace, _, local = name[1:].partition('}')
+    for prefix, uri in element.nsmap.items():
+        if uri == namespace and prefix is not None:
+            return f'{prefix}:{local}'
+    raise _Unsupported(f"no prefix for namespace '{namespace}'")
+
+
+def _start_tag(element: etree._Element, namespaces: Dict[Optional[str], str]) -> Tuple[str, str, Dict]:
+    """
+    Get the start of the start tag of an element, with the namespace declarations it needs at a position.
+
+    Args:
+        element (lxml.etree._Element): The element in the template or in a transformation result.
+        namespaces (Dict[Optional[str], str]): The namespaces declared in the document at this position.
+
+    Returns:
+        Tuple[str, str, Dict]: The start tag without attributes and closing bracket, the element's prefixed
+                               name and the namespaces declared within the element.
+    """
+    local = etree.QName(element).localname
+    qname = f'{element.prefix}:{local}' if element.prefix else local
+    declarations = []
+    scope = dict(namespaces)
+    for prefix, uri in element.nsmap.items():
+        if uri != XSLT_NAMESPACE and namespaces.get(prefix) != uri:
+            declarations.append(f' xmlns:{prefix}="{uri}"' if prefix else f' xmlns="{uri}"')
+            scope[prefix] = uri
+    if element.prefix is None and '}' not in element.tag and scope.get(None):
+        # An element without namespace within a default namespace undeclares it
+        declarations.append(' xmlns=""')
+        scope[None] = None
+    return f'<{qname}{"".join(declarations)}', qname, scope
+
+
+def _convert_element(element: etree._Element, namespaces: Dict[Optional[str], str]) -> _Element:
+    """
+    Convert an element of an XSLT result tree to a rendered element.
+
+    Args:
+        element (lxml.etree._Element): The element, without comments.
+        namespaces (Dict[Optional[str], str]): The namespaces declared in the document at this position.
+
+    Returns:
+        _Element: The rendered element.
+    """
+    start, qname, scope = _start_tag(element, namespaces)
+    attributes = {_attribute_name(element, name): value for name, value in element.attrib.items()}
+    # An empty text node, e.g. copied from the row, is kept and serialized like any text
+    content = [] if element.text is None else [element.text]
+    for node in element:
+        if isinstance(node.tag, str):
+            content.append(_convert_element(node, scope))
+        else:
+            content.append(_Markup(etree.tostring(node, encoding='unicode', with_tail=False)))
+        _append_text(content, node.tail or '')
+    return _Element(start, qname, attributes, content)
+
+
+def compile_attribute_value_template(value: str) -> List[Union[str, _ValueOf]]:
+    """
+    Compile an attribute value template of a literal result element, e.g. 'diag-{position}'.
+
+    Args:
+        value (str): The attribute value in the template.
+
+    Returns:
+        List[Union[str, _ValueOf]]: The literal parts and the fields filled in between them.
+
+    Raises:
+        _Unsupported: If an expression is not a field name.
+    """
+    parts = []
+    for match in _ATTRIBUTE_VALUE_TEMPLATE_PATTERN.finditer(value):
+        literal, expression, _ = match.groups()
+        if literal is not None:
+            parts.append(literal.replace('{{', '{').replace('}}', '}'))
+        elif expression is not None and _NAME_PATTERN.match(expression.strip()):
+            parts.append(_ValueOf(expression.strip()))
+        else:
+            raise _Unsupported(f"unsupported attribute value template '{value}'")
+    return parts
+
+
+def compile_test(expression: str) -> Test:
+    """
+    Compile an XPath test made of comparisons of row fields with string literals, e.g. "a = '' or a = 'OTH'".
+
+    Comparisons are joined with 'or' and 'and'. As in XPath, a comparison with a field that is not in the row
+    is false, with '=' as well as with '!='.
+
+    Args:
+        expression (str): The XPath expression of an xsl:if or xsl:when test.
+
+    Returns:
+        Test: A function that evaluates the test for a row.
+
+    Raises:
+        _Unsupported: If the expression uses any other XPath construct.
+    """
+    alternatives = [[]]
+    position = 0
+    expect_comparison = True
+    while position < len(expression):
+        match = _TEST_TOKEN_PATTERN.match(expression, position)
+        if match is None or (match.group('operator') is None) != expect_comparison:
+            raise _Unsupported(f"unsupported test '{expression}'")
+        position = match.end()
+        expect_comparison = match.group('operator') is not None
+        if match.group('operator') == 'or':
+            alternatives.append([])
+        elif match.group('field') is not None:
+            literal = match.group('single') if match.group('single') is not None else match.group('double')
+            alternatives[-1].append((match.group('field'), match.group('comparison') == '=', literal))
+    if expect_comparison:
+        raise _Unsupported(f"unsupported test '{expression}'")
+
+    def test(row: Row) -> bool:
+        return any(all(field in row and (row[field] == literal) == equals for field, equals, literal in terms)
+                   for terms in alternatives)
+
+    return test
+
+
+class CompiledTemplate:
+    """
+    A CDA stylesheet compiled to a document skeleton that rows are filled into without running XSLT.
+
+    The stylesheet's literal result elements become a skeleton of pre-serialized parts, with slots for the
+    xsl:value-of fields and branches for xsl:if and xsl:choose tests that compare fields with strings. Any
+    other construct is compiled to a small stylesheet of its own and transformed with XSLT, so the rendered
+    documents are the same as those of render_cda.
+    """
+
+    def __init__(self, stylesheet: etree._ElementTree) -> None:
+        """
+        Compile a stylesheet.
+
+        Args:
+            stylesheet (lxml.etree._ElementTree): The parsed XSLT stylesheet.
+
+        Raises:
+            ValueError: If the stylesheet is not a single template producing one document element.
+        """
+        root = stylesheet.getroot()
+        templates = [node for node in root if isinstance(node.tag, str)]
+        if root.tag != f'{_XSL}stylesheet' or len(templates) != 1 or templates[0].tag != f'{_XSL}template':
+            raise ValueError('Only stylesheets with a single template can be compiled.')
+        if set(root.attrib) - {'version', 'id'} or any(
+                '{http://www.w3.org/XML/1998/namespace}space' in node.attrib for node in root.iter()):
+            raise ValueError('Stylesheets changing namespace or whitespace handling cannot be compiled.')
+        template = templates[0]
+        self.match = template.get('match')
+        if not self.match or set(template.attrib) != {'match'}:
+            raise ValueError('Only a template with a match pattern and no other attributes can be compiled.')
+
+        elements = [node for node in template if isinstance(node.tag, str)]
+        if len(elements) != 1 or (template.text or '').strip() or any((node.tail or '').strip()
+                                                                      for node in template):
+            raise ValueError('Only a template producing a single document element can be compiled.')
+        try:
+            self.root = self._compile_literal(elements[0], {}, root=True)
+        except _Unsupported as e:
+            raise ValueError(f'The document element of the template cannot be compiled: {e}')
+
+        placeholder = etree.ElementTree(etree.Element('placeholder'))
+        add_prolog(placeholder)
+        self._prolog = {}
+        for pretty_print in (True, False):
+            serialized = etree.tostring(placeholder, pretty_print=pretty_print, encoding='UTF-8')
+            head, _, tail = serialized.partition(b'<placeholder/>')
+            self._prolog[pretty_print] = (head, tail)
+
+    @classmethod
+    def from_file(cls, xslt_file: str) -> 'CompiledTemplate':
+        """
+        Compile an XSLT file.
+
+        Args:
+            xslt_file (str): The path to the XSLT file.
+
+        Returns:
+            CompiledTemplate: The compiled template.
+
+        Raises:
+            ValueError: If the stylesheet is not a single template producing one document element.
+        """
+        return cls(etree.parse(xslt_file))
+
+    @property
+    def fallbacks(self) -> int:
+        """int: The number of constructs that are transformed with XSLT."""
+        def count(nodes: List[_Instruction]) -> int:
+            total = 0
+            for node in nodes:
+                if isinstance(node, _Fallback):
+                    total += 1
+                elif isinstance(node, _LiteralElement):
+                    total += count(node.body)
+                elif isinstance(node, _Choose):
+                    total += sum(count(body) for _, body in node.branches)
+            return total
+        return count(self.root.body)
+
+    def render(self, row: Row, pretty_print: bool = True) -> bytes:
+        """
+        Render one row to a serialized CDA document.
+
+        Args:
+            row (Row): The row as a dictionary of field names and values.
+            pretty_print (bool, optional): Flag to indicate whether to indent the document. Defaults to True.
+
+        Returns:
+            bytes: The CDA document, byte-identical to the serialized result of render_cda.
+        """
+        out = []
+        self.root.serialize(_RowContext(row), 0, pretty_print, out)
+        head, tail = self._prolog[pretty_print]
+        return head + ''.join(out).encode('utf-8') + tail
+
+    def _compile_literal(self, element: etree._Element, namespaces: Dict[Optional[str], str],
+                         root: bool = False) -> _Instruction:
+        start, qname, scope = _start_tag(element, namespaces)
+        attributes = {}
+        templates = []
+        for name, value in element.attrib.items():
+            if name.startswith(_XSL):
+                raise _Unsupported(f"attribute '{name}' of <{qname}> needs XSLT")
+            name = _attribute_name(element, name)
+            parts = compile_attribute_value_template(value)
+            attributes[name] = ''.join(part for part in parts if isinstance(part, str))
+            if any(isinstance(part, _ValueOf) for part in parts):
+                templates.append(_Attribute(name, parts))
+        body = templates + self._compile_body(element, scope)
+        literal = _LiteralElement(start, qname, attributes, body)
+        if not root and all(node.static for node in body):
+            # Rendered once, a static element only needs to be serialized for the levels it appears at
+            return _StaticNode(_StaticElement(literal.build(_RowContext({}))))
+        return literal
+
+    def _compile_body(self, parent: etree._Element, namespaces: Dict[Optional[str], str]) -> List[_Instruction]:
+        """
+        Compile the children of a literal result element or instruction.
+
+        Args:
+            parent (lxml.etree._Element): The element in the template.
+            namespaces (Dict[Optional[str], str]): The namespaces declared in the document within the element.
+
+        Returns:
+            List[_Instruction]: The compiled children.
+
+        Raises:
+            _Unsupported: If a variable is declared, which only XSLT can resolve for the following siblings.
+        """
+        body = []
+        # Whitespace-only text in a stylesheet is not part of the output
+        if (parent.text or '').strip():
+            body.append(_Text(parent.text))
+        for node in parent:
+            if isinstance(node.tag, str):
+                if node.tag in (f'{_XSL}variable', f'{_XSL}param'):
+                    raise _Unsupported('variables need XSLT')
+                try:
+                    body.append(self._compile_node(node, namespaces))
+                except _Unsupported as e:
+                    logging.debug(f"Rendering <{node.tag}> with XSLT: {e}")
+                    body.append(_Fallback(node, self.match, namespaces))
+            if (node.tail or '').strip():
+                body.append(_Text(node.tail))
+
+        content = False
+        for node in body:
+            if node.attributes and content:
+                # XSLT ignores attributes added after content, which is left to XSLT to decide
+                raise _Unsupported('attributes after content')
+            content = content or node.content
+        return [node for node in body if not isinstance(node, _Text) or node.text]
+
+    def _compile_node(self, node: etree._Element, namespaces: Dict[Optional[str], str]) -> _Instruction:
+        if not node.tag.startswith(_XSL):
+            return self._compile_literal(node, namespaces)
+        instruction = node.tag[len(_XSL):]
+        if instruction == 'comment':
+            # Comments are removed from the documents
+            return _Text('')
+        if instruction == 'text' and not node.attrib and not len(node):
+            return _Text(node.text or '')
+        if instruction == 'value-of' and set(node.attrib) == {'select'}:
+            if not _NAME_PATTERN.match(node.get('select')):
+                raise _Unsupported(f"unsupported select '{node.get('select')}'")
+            return _ValueOf(node.get('select'))
+        if instruction == 'attribute' and set(node.attrib) == {'name'} and _NAME_PATTERN.match(node.get('name')):
+            parts = []
+            for part in self._compile_body(node, namespaces):
+                if isinstance(part, _Text):
+                    parts.append(part.text)
+                elif isinstance(part, _ValueOf):
+                    parts.append(part)
+                else:
+                    raise _Unsupported('xsl:attribute with other content than text')
+            return _Attribute(node.get('name'), parts)
+        if instruction == 'if' and set(node.attrib) == {'test'}:
+            return _Choose([(compile_test(node.get('test')), self._compile_body(node, namespaces))])
+        if instruction == 'choose' and not node.attrib:
+            branches = []
+            for branch in node:
+                if not isinstance(branch.tag, str):
+                    continue
+                if branch.tag == f'{_XSL}when' and set(branch.attrib) == {'test'}:
+                    branches.append((compile_test(branch.get('test')), self._compile_body(branch, namespaces)))
+                elif branch.tag == f'{_XSL}otherwise' and not branch.attrib:
+                    branches.append((None, self._compile_body(branch, namespaces)))
+                else:
+                    raise _Unsupported(f"unsupported branch <{branch.tag}>")
+            return _Choose(branches)
+        raise _Unsupported(f"unsupported instruction xsl:{instruction}")
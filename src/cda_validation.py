@@ -0,0 +1,273 @@
+import json
+import logging
+import math
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+from lxml import etree, isoschematron
+
+from csv_to_cda import Document, serialize_document
+from output_sinks import OutputSink
+from stage_timings import StageTimings
+
+# Report of the validation stage, written to the output directory
+VALIDATION_REPORT = 'validation_report.json'
+# Number of sampled documents sent to a validation worker at once
+DEFAULT_VALIDATION_BATCH_SIZE = 16
+# Failed documents listed in the report with their errors, the others are only counted
+MAX_REPORTED_DOCUMENTS = 100
+_SVRL = '{http://purl.oclc.org/dsdl/svrl}'
+
+# An error as dictionary of source ('xsd' or 'schematron'), location and message
+ValidationError = Dict[str, str]
+
+
+class CdaValidator:
+    """
+    Validates CDA documents against an XML schema, a Schematron schema or both, compiled once.
+    """
+
+    def __init__(self, xsd_path: Optional[str] = None, schematron_path: Optional[str] = None) -> None:
+        """
+        Compile the schemas.
+
+        Args:
+            xsd_path (str, optional): The path to the XML schema.
+            schematron_path (str, optional): The path to the ISO Schematron schema.
+
+        Raises:
+            ValueError: If neither schema is given or a schema cannot be compiled.
+        """
+        if not xsd_path and not schematron_path:
+            raise ValueError('Validation needs an XML schema, a Schematron schema or both')
+        try:
+            self.schema = etree.XMLSchema(etree.parse(xsd_path)) if xsd_path else None
+            self.schematron = isoschematron.Schematron(etree.parse(schematron_path),
+                                                       store_report=True) if schematron_path else None
+        except (etree.XMLSyntaxError, etree.XMLSchemaParseError, etree.SchematronParseError) as e:
+            raise ValueError(f'The schema cannot be compiled: {e}')
+
+    def validate(self, document: Document) -> List[ValidationError]:
+        """
+        Validate a CDA document.
+
+        Args:
+            document (Document): The CDA document, as element tree or serialized.
+
+        Returns:
+            List[ValidationError]: The errors, empty if the document is valid.
+        """
+        if isinstance(document, bytes):
+            try:
+                document = etree.ElementTree(etree.fromstring(document))
+            except etree.XMLSyntaxError as e:
+                return [{'source': 'xml', 'location': f'line {e.lineno}', 'message': e.msg}]
+        errors = []
+        if self.schema is not None and not self.schema.validate(document):
+            # The element path, as line numbers are only known for parsed documents
+            errors += [{'source': 'xsd', 'location': error.path, 'message': error.message}
+                       for error in self.schema.error_log]
+        if self.schematron is not None and not self.schematron.validate(document):
+            for result in self.schematron.validation_report.getroot():
+                if result.tag in (f'{_SVRL}failed-assert', f'{_SVRL}successful-report'):
+                    message = ' '.join((result.findtext(f'{_SVRL}text') or result.get('test', '')).split())
+                    errors.append({'source': 'schematron', 'location': result.get('location', ''),
+                                   'message': message})
+        return errors
+
+
+def is_sampled(index: int, every: int = 1, rate: Optional[float] = None) -> bool:
+    """
+    Check whether a document is validated in sampling mode.
+
+    Args:
+        index (int): The number of the document, starting at 1.
+        every (int, optional): Validate every k-th document. Defaults to 1, all documents.
+        rate (float, optional): Validate this share of the documents instead, spread evenly over the run.
+
+    Returns:
+        bool: True if the document is validated.
+    """
+    if rate is not None:
+        return math.floor(index * rate) != math.floor((index - 1) * rate)
+    return index % every == 0
+
+
+# Validator of a validation worker process, set up once by _init_validation_worker
+_validation_state: dict = {}
+
+
+def _init_validation_worker(xsd_path: Optional[str], schematron_path: Optional[str]) -> None:
+    _validation_state['validator'] = CdaValidator(xsd_path, schematron_path)
+
+
+def _validate_batch_in_worker(batch: List[Tuple[int, bytes]]) -> Tuple[List[Tuple[int, List[ValidationError]]], float]:
+    start = time.perf_counter()
+    results = [(index, _validation_state['validator'].validate(document)) for index, document in batch]
+    return results, time.perf_counter() - start
+
+
+class ValidatingSink(OutputSink):
+    """
+    Validates a sample of the documents on their way to another sink and reports the failures.
+
+    With one worker, the documents are validated in the thread writing them. With more, batches of serialized
+    documents are validated in a pool of processes that each compile the schemas once, with at most two
+    batches per worker pending. The time spent validating is added to the timings as 'validating', summed over
+    the workers and including the serialization for them, and the time spent waiting for the pool as 'waiting for
+    validation'. Neither counts as writing, which is only the time the documents take to be passed on.
+    """
+
+    def __init__(self, sink: OutputSink, report_path: str, xsd_path: Optional[str] = None,
+                 schematron_path: Optional[str] = None, every: int = 1, rate: Optional[float] = None,
+                 workers: int = 1, pretty_print: bool = True, timings: Optional[StageTimings] = None) -> None:
+        """
+        Initialize the ValidatingSink and compile the schemas.
+
+        Args:
+            sink (OutputSink): The sink the documents are passed on to. It is closed by close.
+            report_path (str): The path of the JSON report written by close.
+            xsd_path (str, optional): The path to the XML schema.
+            schematron_path (str, optional): The path to the ISO Schematron schema.
+            every (int, optional): Validate every k-th document. Defaults to 1, all documents.
+            rate (float, optional): Validate this share of the documents instead of every k-th.
+            workers (int, optional): Number of validation processes. Defaults to 1, validating in this process.
+            pretty_print (bool, optional): Flag to indicate whether element trees are indented when they are
+                                           serialized for a worker. Defaults to True.
+            timings (StageTimings, optional): Timings to add the time spent to.
+
+        Raises:
+            ValueError: If the sampling options are invalid or the schemas cannot be compiled.
+        """
+        if every < 1 or (rate is not None and not 0 < rate <= 1):
+            raise ValueError('Validate every k-th document with k >= 1, or a share in (0, 1]')
+        # Compiled here in any case, so that an invalid schema fails before any document is written
+        self.validator = CdaValidator(xsd_path, schematron_path)
+        self.sink = sink
+        self.report_path = report_path
+        self.xsd_path = xsd_path
+        self.schematron_path = schematron_path
+        self.every = every
+        self.rate = rate
+        self.workers = workers
+        self.pretty_print = pretty_print
+        self.timings = timings or StageTimings()
+        self.documents = 0
+        self.validated = 0
+        self.failures: List[Tuple[int, List[ValidationError]]] = []
+        self.failed = 0
+        self.messages: Counter = Counter()
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._batch: List[Tuple[int, bytes]] = []
+        self._pending: Deque[Future] = deque()
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_validation_worker,
+                                                 initargs=(xsd_path, schematron_path))
+
+    def write(self, index: int, document: Document) -> None:
+        # Passed on first, so that a checkpoint never counts a document that failed to be written
+        self.sink.write(index, document)
+        self.documents += 1
+        if is_sampled(index, self.every, self.rate):
+            if self._executor is None:
+                with self.timings.measure('validating'):
+                    self._record(index, self.validator.validate(document))
+            else:
+                with self.timings.measure('validating'):
+                    self._batch.append((index, serialize_document(document, self.pretty_print)))
+                if len(self._batch) >= DEFAULT_VALIDATION_BATCH_SIZE:
+                    self._submit()
+
+    def sync(self) -> None:
+        self.sink.sync()
+
+    @property
+    def resumable(self) -> bool:
+        return self.sink.resumable
+
+    def checkpoint(self) -> dict:
+        self._collect_all()
+        return {
+            'validation': {
+                'documents': self.documents,
+                'validated': self.validated,
+                'failed': self.failed,
+                # In insertion order, which orders messages of the same count in the report
+                'messages': [[source, message, count] for (source, message), count in self.messages.items()],
+                'failures': [[index, errors] for index, errors in self.failures],
+            },
+            'sink': self.sink.checkpoint(),
+        }
+
+    def restore(self, state: dict) -> None:
+        if 'validation' not in state:
+            raise ValueError('The checkpoint was written without validation')
+        validation = state['validation']
+        self.documents = validation['documents']
+        self.validated = validation['validated']
+        self.failed = validation['failed']
+        self.messages = Counter({(source, message): count for source, message, count in validation['messages']})
+        self.failures = [(index, errors) for index, errors in validation['failures']]
+        self.sink.restore(state['sink'])
+
+    def close(self) -> None:
+        try:
+            if self._executor is not None:
+                try:
+                    self._collect_all()
+                finally:
+                    self._executor.shutdown(cancel_futures=True)
+                    self._executor = None
+            self._write_report()
+        finally:
+            self.sink.close()
+
+    def _submit(self) -> None:
+        self._pending.append(self._executor.submit(_validate_batch_in_worker, self._batch))
+        self._batch = []
+        if len(self._pending) >= 2 * self.workers:
+            self._collect()
+
+    def _collect_all(self) -> None:
+        if self._batch:
+            self._submit()
+        while self._pending:
+            self._collect()
+
+    def _collect(self) -> None:
+        with self.timings.measure('waiting for validation'):
+            results, seconds = self._pending.popleft().result()
+        self.timings.add('validating', seconds)
+        for index, errors in results:
+            self._record(index, errors)
+
+    def _record(self, index: int, errors: List[ValidationError]) -> None:
+        self.validated += 1
+        if not errors:
+            return
+        self.failed += 1
+        self.messages.update({(error['source'], error['message']) for error in errors})
+        if len(self.failures) < MAX_REPORTED_DOCUMENTS:
+            self.failures.append((index, errors))
+
+    def _write_report(self) -> None:
+        report = {
+            'xsd': self.xsd_path,
+            'schematron': self.schematron_path,
+            'sampling': {'every': self.every} if self.rate is None else {'rate': self.rate},
+            'documents': self.documents,
+            'validated': self.validated,
+            'failed': self.failed,
+            'messages': [{'source': source, 'message': message, 'documents': count}
+                         for (source, message), count in self.messages.most_common()],
+            'failures': [{'index': index, 'name': f'cda_{index}.xml', 'errors': errors}
+                         for index, errors in sorted(self.failures)],
+        }
+        with open(self.report_path, 'w', encoding='UTF-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        log = logging.warning if self.failed else logging.info
+        log(f"Validated {self.validated} of {self.documents} CDA documents, {self.failed} failed. "
+            f"See {self.report_path}.")
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+
+from csv_to_cda import Document
+from output_sinks import OutputSink
+
+# Checkpoint file in the output directory
+CHECKPOINT = 'checkpoint.json'
+CHECKPOINT_VERSION = 1
+
+
+def file_digest(path: str) -> str:
+    """
+    Get the SHA-256 checksum of a file, to detect input files that changed between a run and its resumption.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        str: The hexadecimal checksum.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(path: str, run: dict) -> dict:
+    """
+    Load the checkpoint of an interrupted run.
+
+    Args:
+        path (str): The path to the checkpoint file.
+        run (dict): The options and input checksums of the resuming run. A seed of None is taken from the
+                    checkpoint.
+
+    Returns:
+        dict: The checkpoint, with 'run', 'documents' (the number of documents completed), 'complete' and
+              'sink' (the state of the output sink).
+
+    Raises:
+        ValueError: If there is no checkpoint or it was written by a run with other options or inputs.
+    """
+    if not os.path.exists(path):
+        raise ValueError(f'There is no checkpoint to resume from at {path}')
+    with open(path, 'r', encoding='UTF-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"The checkpoint {path} has version {checkpoint.get('version')}, "
+                         f"expected {CHECKPOINT_VERSION}")
+    different = [option for option, value in run.items()
+                 if value != checkpoint['run'].get(option) and not (option == 'seed' and value is None)]
+    if different:
+        raise ValueError(f"The checkpoint {path} was written by a run with different {', '.join(different)}")
+    return checkpoint
+
+
+class CheckpointingSink(OutputSink):
+    """
+    Writes a checkpoint whenever the documents of every chunks-th chunk are written to another sink.
+
+    A checkpoint records the options of the run, including the seed that all random streams derive from, the
+    number of completed documents and the state of the sink, e.g. the length of its manifest. As every row only
+    depends on the seed and its row number, this is all that is needed to continue the run from the next
+    chunk. Before the checkpoint is written, the sink makes the documents durable; the checkpoint file itself
+    is replaced atomically. When the sink is closed, also after an error, a last checkpoint records the
+    documents written so far, and whether the run is complete.
+    """
+
+    def __init__(self, sink: OutputSink, path: str, run: dict, total: int, chunk_size: int, chunks: int = 1,
+                 documents: int = 0) -> None:
+        """
+        Initialize the CheckpointingSink.
+
+        Args:
+            sink (OutputSink): The resumable sink the documents are passed on to. It is closed by close.
+            path (str): The path of the checkpoint file.
+            run (dict): The options and input checksums of the run, with the seed resolved.
+            total (int): Number of documents of the complete run.
+            chunk_size (int): Number of rows per chunk.
+            chunks (int, optional): Number of chunks between checkpoints. Defaults to 1.
+            documents (int, optional): Number of documents completed before, when resuming. Defaults to 0.
+
+        Raises:
+            ValueError: If the sink is not resumable or chunks is not positive.
+        """
+        if not sink.resumable:
+            raise ValueError(f'Checkpoints need a resumable output sink, {type(sink).__name__} is not')
+        if chunks < 1:
+            raise ValueError('Checkpoints must be written every one or more chunks')
+        self.sink = sink
+        self.path = path
+        self.run = run
+        self.total = total
+        self.interval = chunk_size * chunks
+        self.documents = documents
+
+    def write(self, index: int, document: Document) -> None:
+        self.sink.write(index, document)
+        self.documents = index
+        if index % self.interval == 0:
+            self._write_checkpoint()
+
+    def sync(self) -> None:
+        self.sink.sync()
+
+    def close(self) -> None:
+        try:
+            self._write_checkpoint()
+        finally:
+            self.sink.close()
+
+    def _write_checkpoint(self) -> None:
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'run': self.run,
+            'documents': self.documents,
+            'complete': self.documents == self.total,
+            'sink': self.sink.checkpoint(),
+        }
+        # Written next to the checkpoint and renamed, so that an interruption never leaves half a checkpoint
+        partial_path = f'{self.path}.partial'
+        with open(partial_path, 'w', encoding='UTF-8') as f:
+            json.dump(checkpoint, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial_path, self.path)
+        logging.debug(f"Checkpoint after {self.documents} CDA documents")
@@ -1,5 +1,8 @@
 import argparse
 from dataclasses import dataclass
+from typing import Optional
+
+from generate_csv import DEFAULT_CHUNK_SIZE
 
 @dataclass
 class Config:
@@ -7,17 +10,75 @@ class Config:
     Configuration class to hold command-line arguments.
 
     Attributes:
-        n (int): Number of patients to generate.
-        cleanup (bool): Flag to indicate whether to remove intermediate CSV file after processing.
+        number (int): Number of patients to generate.
+        cleanup (bool): Flag to indicate whether to remove the intermediate CSV file after processing.
         xlsx (str): Filepath to the input Excel file.
         xslt (str): Filepath to the input XSLT file.
-        output_dir (str): Output directory for generated files.
+        output (str): Output directory for generated files, or "-" for stdout.
+        cache_dir (str, optional): Directory for value set snapshots, '' disables snapshots.
+        seed (int, optional): Seed for all random streams. Runs with the same seed produce identical output.
+        chunk_size (int): Number of rows generated and processed at once.
+        workers (int): Number of worker processes generating chunks.
+        write_csv (bool): Flag to indicate whether to write the generated rows to an intermediate CSV file.
+        rules (str, optional): Filepath to the TOML file declaring the dependency rules.
+        transform_workers (int): Number of worker processes transforming rows to CDA documents.
+        pretty_print (bool): Flag to indicate whether to indent the CDA documents.
+        renderer (str): Engine rendering rows to CDA documents, 'xslt' or 'compiled'.
+        sink (str): How the CDA documents are written: 'directory', 'tar', 'zip', 'ndjson' or 'length-prefixed'.
+        compression (str): Compression of archive and stream sinks: 'none', 'gzip' or 'zstd'.
+        max_part_size (int, optional): Size in MiB at which archive and stream sinks start a new file.
+        http_url (str, optional): Import URL the HTTP sink posts the CDA documents to.
+        http_concurrency (int): Maximum number of requests of the HTTP sink in flight.
+        http_retries (int): Number of retries of a failed request of the HTTP sink.
+        http_max_failures (int): Number of documents the HTTP sink may fail to deliver before the run fails.
+        layout (str): Layout of the directory sink: 'flat', 'index' or 'hash'.
+        fanout (int): Number of entries per subdirectory of the sharded layouts.
+        manifest (bool): Flag to indicate whether the directory sink writes manifest.csv.
+        writer_queue (int): Number of document batches that may wait for the writer thread.
+        fsync_every (int, optional): Number of documents after which written documents are synced to disk.
+        xsd (str, optional): Filepath to an XML schema to validate the CDA documents against.
+        schematron (str, optional): Filepath to an ISO Schematron schema to validate the CDA documents against.
+        validate_every (int): Validate every k-th document only.
+        validate_rate (float, optional): Validate this share of the documents instead of every k-th.
+        validation_workers (int): Number of worker processes validating documents.
+        validation_report (str, optional): Filepath of the validation report.
+        checkpoint_every (int, optional): Number of chunks after which a checkpoint is written.
+        resume (bool): Flag to indicate whether to continue an interrupted run from its checkpoint.
     """
     number: int
     cleanup: bool
     xlsx: str
     xslt: str
     output: str
+    cache_dir: Optional[str] = None
+    seed: Optional[int] = None
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    workers: int = 1
+    write_csv: bool = False
+    rules: Optional[str] = None
+    transform_workers: int = 1
+    pretty_print: bool = True
+    renderer: str = 'xslt'
+    sink: str = 'directory'
+    compression: str = 'none'
+    max_part_size: Optional[int] = None
+    http_url: Optional[str] = None
+    http_concurrency: int = 8
+    http_retries: int = 3
+    http_max_failures: int = 0
+    layout: str = 'flat'
+    fanout: int = 256
+    manifest: bool = False
+    writer_queue: int = 8
+    fsync_every: Optional[int] = None
+    xsd: Optional[str] = None
+    schematron: Optional[str] = None
+    validate_every: int = 1
+    validate_rate: Optional[float] = None
+    validation_workers: int = 1
+    validation_report: Optional[str] = None
+    checkpoint_every: Optional[int] = None
+    resume: bool = False
 
     @classmethod
     def from_args(cls):
@@ -29,11 +90,81 @@ class Config:
         """
         parser = argparse.ArgumentParser(prog='cda-test-data-generator', description='Process Excel to CDA.')
         parser.add_argument('--number', type=int, required=True, help='Number of patients to generate.')
-        parser.add_argument('--cleanup', action='store_true', help='Remove intermediate CSV file after processing.')
+        parser.add_argument('--cleanup', action='store_true', help='Remove the intermediate CSV file written with --write-csv after processing.')
         parser.add_argument('--xlsx', type=str, required=True, help='Filepath to the input Excel file.')
         parser.add_argument('--xslt', type=str, required=True, help='Filepath to the input XSLT file.')
         parser.add_argument('--output', type=str, required=False, default='.',
-                            help='Output directory for generated files.')
+                            help='Output directory for generated files. '
+                                 '"-" writes an archive or stream sink to stdout.')
+        parser.add_argument('--cache-dir', type=str, required=False, default=None,
+                            help='Directory for binary value set snapshots. Pass an empty string to disable them.')
+        parser.add_argument('--seed', type=int, required=False, default=None,
+                            help='Seed for all random streams. Runs with the same seed produce identical output.')
+        parser.add_argument('--chunk-size', type=int, required=False, default=DEFAULT_CHUNK_SIZE,
+                            help='Number of rows generated and processed at once. Bounds peak memory.')
+        parser.add_argument('--workers', type=int, required=False, default=1,
+                            help='Number of worker processes generating chunks. Does not change the output.')
+        parser.add_argument('--write-csv', action='store_true',
+                            help='Write the generated rows to data.csv in the output directory for debugging.')
+        parser.add_argument('--rules', type=str, required=False, default=None,
+                            help='Filepath to the TOML file declaring the dependency rules. '
+                                 'Defaults to resources/dependency_rules.toml.')
+        parser.add_argument('--transform-workers', type=int, required=False, default=1,
+                            help='Number of worker processes transforming rows to CDA documents with XSLT. '
+                                 'Does not change the output.')
+        parser.add_argument('--pretty-print', action=argparse.BooleanOptionalAction, default=True,
+                            help='Indent the CDA documents. --no-pretty-print writes them without whitespace.')
+        parser.add_argument('--renderer', type=str, required=False, default='xslt', choices=['xslt', 'compiled'],
+                            help='Engine rendering rows to CDA documents. The compiled template renders the same '
+                                 'documents faster and falls back to XSLT for constructs it cannot compile.')
+        parser.add_argument('--sink', type=str, required=False, default='directory',
+                            choices=['directory', 'tar', 'zip', 'ndjson', 'length-prefixed', 'http'],
+                            help='How the CDA documents are written: one file each, bundled in archives, as '
+                                 'one concatenated stream or posted to an import URL.')
+        parser.add_argument('--compression', type=str, required=False, default='none',
+                            choices=['none', 'gzip', 'zstd'],
+                            help='Compression of archive and stream sinks. zstd needs the zstandard package.')
+        parser.add_argument('--max-part-size', type=int, required=False, default=None,
+                            help='Size in MiB at which archive and stream sinks start a new file.')
+        parser.add_argument('--http-url', type=str, required=False, default=None,
+                            help='Import URL the http sink posts the CDA documents to.')
+        parser.add_argument('--http-concurrency', type=int, required=False, default=8,
+                            help='Maximum number of requests of the http sink in flight.')
+        parser.add_argument('--http-retries', type=int, required=False, default=3,
+                            help='Number of retries with exponential backoff of a failed request of the http sink.')
+        parser.add_argument('--http-max-failures', type=int, required=False, default=0,
+                            help='Number of documents the http sink may fail to deliver before the run fails.')
+        parser.add_argument('--layout', type=str, required=False, default='flat', choices=['flat', 'index', 'hash'],
+                            help='Layout of the directory sink: all files in the output directory, or spread over '
+                                 'two levels of subdirectories by document index or by hash.')
+        parser.add_argument('--fanout', type=int, required=False, default=256,
+                            help='Number of entries per subdirectory of the index and hash layouts.')
+        parser.add_argument('--manifest', action='store_true',
+                            help='Write manifest.csv with the index, path, size, checksum and encounter ID of every '
+                                 'document to the output directory while the documents are written.')
+        parser.add_argument('--writer-queue', type=int, required=False, default=8,
+                            help='Number of batches of 64 documents that may wait for the writer thread before '
+                                 'the transformation blocks.')
+        parser.add_argument('--fsync-every', type=int, required=False, default=None,
+                            help='Sync the written documents to disk after this many documents and at the end.')
+        parser.add_argument('--xsd', type=str, required=False, default=None,
+                            help='Filepath to an XML schema to validate the CDA documents against.')
+        parser.add_argument('--schematron', type=str, required=False, default=None,
+                            help='Filepath to an ISO Schematron schema to validate the CDA documents against.')
+        parser.add_argument('--validate-every', type=int, required=False, default=1,
+                            help='Validate every k-th document only.')
+        parser.add_argument('--validate-rate', type=float, required=False, default=None,
+                            help='Validate this share of the documents, spread evenly, instead of every k-th.')
+        parser.add_argument('--validation-workers', type=int, required=False, default=1,
+                            help='Number of worker processes validating documents.')
+        parser.add_argument('--validation-report', type=str, required=False, default=None,
+                            help='Filepath of the validation report. Defaults to validation_report.json in the '
+                                 'output directory.')
+        parser.add_argument('--checkpoint-every', type=int, required=False, default=None,
+                            help='Write a checkpoint to the output directory after this many chunks.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted run from the checkpoint in the output directory. The '
+                                 'output is the same as that of an uninterrupted run.')
 
         args = parser.parse_args()
         return cls(
@@ -41,8 +172,34 @@ class Config:
             cleanup=args.cleanup,
             xlsx=args.xlsx,
             xslt=args.xslt,
-            output=args.output
+            output=args.output,
+            cache_dir=args.cache_dir,
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            write_csv=args.write_csv,
+            rules=args.rules,
+            transform_workers=args.transform_workers,
+            pretty_print=args.pretty_print,
+            renderer=args.renderer,
+            sink=args.sink,
+            compression=args.compression,
+            max_part_size=args.max_part_size,
+            http_url=args.http_url,
+            http_concurrency=args.http_concurrency,
+            http_retries=args.http_retries,
+            http_max_failures=args.http_max_failures,
+            layout=args.layout,
+            fanout=args.fanout,
+            manifest=args.manifest,
+            writer_queue=args.writer_queue,
+            fsync_every=args.fsync_every,
+            xsd=args.xsd,
+            schematron=args.schematron,
+            validate_every=args.validate_every,
+            validate_rate=args.validate_rate,
+            validation_workers=args.validation_workers,
+            validation_report=args.validation_report,
+            checkpoint_every=args.checkpoint_every,
+            resume=args.resume
         )
-
-# Create a Config instance from command-line arguments
-config = Config.from_args()
\ No newline at end of file
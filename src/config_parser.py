@@ -1,17 +1,17 @@
 import os
+import re
 from datetime import datetime
 from typing import Dict, Any
 
-from config import config
-
 class ConfigParserFactory:
     @staticmethod
-    def get_handler(key: str) -> object:
+    def get_handler(key: str, base_dir: str = '') -> object:
         """
         Get the appropriate handler class based on the provided key.
 
         Args:
             key (str): The key to identify the handler.
+            base_dir (str, optional): The directory linked files are relative to. Defaults to the working directory.
 
         Returns:
             object: An instance of the handler class corresponding to the key.
@@ -26,19 +26,29 @@ class ConfigParserFactory:
             "start_date": DateHandler,
             "end_date": DateHandler,
             "column": DefaultHandler,
-            "dependent_concept_id_1": DefaultHandler,
-            "dependent_column_1": DefaultHandler
+            "weight": DefaultHandler
+        }
+        # Numbered keys like dependent_column_1, dependent_concept_id_1, dependent_column_2, ...
+        numbered_handlers = {
+            r"dependent_column_\d+": DefaultHandler,
+            r"dependent_concept_id_\d+": DefaultHandler
         }
-        return handlers.get(key, ErrorHandler)(key)
+        if key not in handlers:
+            for pattern, handler in numbered_handlers.items():
+                if re.fullmatch(pattern, key):
+                    return handler(key, base_dir)
+        return handlers.get(key, ErrorHandler)(key, base_dir)
 
 class ConfigParser:
     @staticmethod
-    def parse(config_string: str) -> dict:
+    def parse(config_string: str, base_dir: str = '') -> dict:
         """
         Parse a semicolon-separated string into a dictionary of parameters.
 
         Args:
             config_string (str): The string to parse, formatted as 'key1=value1;key2=value2;...'.
+            base_dir (str, optional): The directory linked files are relative to, usually that of the Excel file.
+                                      Defaults to the working directory.
 
         Returns:
             dict: A dictionary containing the parsed parameters.
@@ -68,7 +78,7 @@ class ConfigParser:
                 if not key or not value:
                     raise ValueError(f"Empty key or value in parameter: '{param}'")
 
-                handler = ConfigParserFactory.get_handler(key)
+                handler = ConfigParserFactory.get_handler(key, base_dir)
                 handler.handle(param_dict, value)
 
         except Exception as e:
@@ -83,10 +93,12 @@ class AbstractHandler:
 
     Attributes:
         key (str): The key associated with the handler.
+        base_dir (str): The directory linked files are relative to.
     """
 
-    def __init__(self, key: str) -> None:
+    def __init__(self, key: str, base_dir: str = '') -> None:
         self.key = key
+        self.base_dir = base_dir
 
     def handle(self, param_dict: Dict[str, Any], value: str) -> None:
         raise NotImplementedError
@@ -195,7 +207,7 @@ class LinkHandler(AbstractHandler):
             raise ValueError("Empty file path provided")
 
         try:
-            full_path = os.path.join(os.path.dirname(config.xlsx), value)
+            full_path = os.path.join(self.base_dir, value)
             if not os.path.isfile(full_path):
                 raise ValueError(f"File '{value}' does not exist in resources/value_sets")
             param_dict["link"] = full_path
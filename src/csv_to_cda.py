@@ -1,10 +1,29 @@
 import csv
+import logging
 import os
-from typing import Callable
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Union
+
+import pandas as pd
 
-import lxml.etree
 from lxml import etree
 
+from table_format import column_to_text, date_formats
+
+# Number of rows a transform worker process renders per task
+DEFAULT_BATCH_SIZE = 64
+# Characters libxml2 treats as blank when removing ignorable whitespace
+BLANK_CHARACTERS = ' \t\n\r'
+# Comment added before the document element of every CDA document
+WARNING_COMMENT = "WARNING!. This file was random generated."
+# Engines rendering rows to CDA documents, see create_renderer
+RENDERERS = ('xslt', 'compiled')
+
+# A CDA document as element tree, or serialized if it was transformed in another process
+Document = Union[etree._ElementTree, bytes]
+
 
 def create_directory(path: str) -> None:
     """
@@ -37,6 +56,23 @@ def csv_to_dict(csv_file: str) -> dict:
             yield {field.strip(): value.strip() for field, value in zip(header_row, row)}
 
 
+def table_to_dict(table: pd.DataFrame) -> Iterator[dict]:
+    """
+    Convert the rows of an in-memory table to dictionaries, the same way csv_to_dict reads a CSV file of it.
+
+    Args:
+        table (pd.DataFrame): The table to convert.
+
+    Yields:
+        dict: A dictionary where the keys are the column names and the values are the corresponding row values.
+    """
+    fields = [str(column).strip() for column in table.columns]
+    formats = date_formats(table)
+    texts = [column_to_text(table[column], formats.get(column)).tolist() for column in table.columns]
+    for row in zip(*texts):
+        yield {field: value.strip() for field, value in zip(fields, row)}
+
+
 def dict_to_xml(data: dict) -> etree.Element:
     """
     Convert a dictionary to an XML element tree.
@@ -54,21 +90,6 @@ def dict_to_xml(data: dict) -> etree.Element:
     return root
 
 
-def save_xml(xml_root: lxml.etree.Element, file_path: str) -> None:
-    """
-    Save an XML element tree to a file.
-
-    Args:
-        xml_root (lxml.etree.Element): The root element of the XML tree to save.
-        file_path (str): The path to the file where the XML tree will be saved.
-
-    Returns:
-        None
-    """
-    with open(file_path, 'wb') as xml_file:
-        xml_file.write(etree.tostring(xml_root, pretty_print=True, encoding='UTF-8'))
-
-
 def transform_xml(xml_root: etree.Element, xslt_transform: Callable) -> etree._XSLTResultTree:
     """
     Apply an XSLT transformation to an XML element tree.
@@ -117,35 +138,227 @@ def add_warning_comment(tree: etree.ElementTree, warning: str) -> etree.ElementT
     return tree
 
 
-def csv_to_cda(csv_file: str, xslt_file: str, output_dir: str) -> None:
+def add_prolog(tree: etree._ElementTree) -> etree._ElementTree:
     """
-    Convert a CSV file to CDA format using XSLT transformation and save the output.
+    Add the processing instructions and the warning comment every CDA document starts with.
+
+    Args:
+        tree (lxml.etree._ElementTree): The XML element tree of the CDA document.
+
+    Returns:
+        lxml.etree._ElementTree: The XML element tree with the added processing instructions and comment.
+    """
+    return add_warning_comment(add_processing_instructions(tree), WARNING_COMMENT)
+
+
+def load_xslt(xslt_file: str) -> etree.XSLT:
+    """
+    Load and compile an XSLT file.
+
+    Args:
+        xslt_file (str): The path to the XSLT file.
+
+    Returns:
+        lxml.etree.XSLT: The compiled XSLT transformation.
+    """
+    return etree.XSLT(etree.parse(xslt_file))
+
+
+def strip_comments_and_blank_text(tree: etree._ElementTree) -> etree._ElementTree:
+    """
+    Remove comments and ignorable whitespace from an XML element tree in place.
+
+    The result is the same as serializing the tree and parsing it again with remove_comments and
+    remove_blank_text: within an element, whitespace-only text is dropped until the first text with other
+    characters, and an element whose only content is whitespace keeps it.
+
+    Args:
+        tree (lxml.etree._ElementTree): The XML element tree to clean up.
+
+    Returns:
+        lxml.etree._ElementTree: The same XML element tree.
+    """
+    root = tree.getroot()
+    etree.strip_tags(root, etree.Comment)
+    for element in root.iter(etree.Element):
+        if not len(element):
+            continue
+        if element.text:
+            if element.text.strip(BLANK_CHARACTERS):
+                continue
+            element.text = None
+        for child in element:
+            if child.tail:
+                if child.tail.strip(BLANK_CHARACTERS):
+                    break
+                child.tail = None
+    return tree
+
+
+def render_cda(row: dict, xslt_transform: etree.XSLT) -> etree._ElementTree:
+    """
+    Transform one row to a CDA document.
+
+    The XSLT result tree is post-processed in place instead of being serialized and parsed again.
+
+    Args:
+        row (dict): The row as a dictionary of field names and values.
+        xslt_transform (lxml.etree.XSLT): The compiled XSLT transformation.
+
+    Returns:
+        lxml.etree._ElementTree: The CDA document.
+    """
+    # Create raw XML
+    raw_xml = dict_to_xml(row)
+
+    # Transform raw XML with XSLT
+    transformed_xml = transform_xml(raw_xml, xslt_transform)
+    tree = strip_comments_and_blank_text(etree.ElementTree(transformed_xml.getroot()))
+    return add_prolog(tree)
+
+
+def create_renderer(xslt_file: str, renderer: str = 'xslt', pretty_print: bool = True) -> Callable[[dict], Document]:
+    """
+    Create a function rendering rows to CDA documents.
+
+    The 'xslt' renderer transforms every row with the XSLT and returns element trees. The 'compiled' renderer
+    fills rows into a document skeleton compiled from the XSLT and returns serialized documents; constructs
+    it cannot compile are still transformed with XSLT, and if the template cannot be compiled at all, all
+    rows are. The whole XSLT is only compiled if rows are transformed with it.
 
     Args:
-        csv_file (str): The path to the CSV file to convert.
         xslt_file (str): The path to the XSLT file for transformation.
+        renderer (str, optional): One of RENDERERS. Defaults to 'xslt'.
+        pretty_print (bool, optional): Flag to indicate whether the compiled renderer indents the documents.
+                                       Defaults to True.
+
+    Returns:
+        Callable[[dict], Document]: A function rendering a row to its CDA document.
+
+    Raises:
+        ValueError: If the renderer is unknown.
+    """
+    if renderer not in RENDERERS:
+        raise ValueError(f"Unknown renderer '{renderer}', expected one of {', '.join(RENDERERS)}")
+    if renderer == 'compiled':
+        # Imported here, as the compiled template builds on the functions of this module
+        from cda_template import CompiledTemplate
+        try:
+            template = CompiledTemplate.from_file(xslt_file)
+        except ValueError as e:
+            logging.warning(f"Rendering all rows with XSLT, the template cannot be compiled: {e}")
+        else:
+            logging.info(f"Compiled the template, {template.fallbacks} constructs are rendered with XSLT.")
+            return lambda row: template.render(row, pretty_print)
+    xslt_transform = load_xslt(xslt_file)
+    return lambda row: render_cda(row, xslt_transform)
+
+
+def write_cda(document: Document, output_dir: str, index: int, pretty_print: bool = True) -> None:
+    """
+    Save a CDA document as 'cda_{index}.xml'. Element trees are serialized straight into the file.
+
+    Args:
+        document (Document): The CDA document, as element tree or already serialized.
         output_dir (str): The directory to save the output files.
+        index (int): The number of the document.
+        pretty_print (bool, optional): Flag to indicate whether to indent element trees. Defaults to True.
 
     Returns:
         None
     """
-    cda_path = output_dir
+    with open(os.path.join(output_dir, f'cda_{index}.xml'), 'wb') as xml_file:
+        if isinstance(document, bytes):
+            xml_file.write(document)
+        else:
+            document.write(xml_file, pretty_print=pretty_print, encoding='UTF-8')
+
 
-    # Load XSLT transformation from Skeleton
-    xslt_transform = etree.XSLT(etree.parse(xslt_file))
-    # Create Parser
-    parser = etree.XMLParser(remove_blank_text=True, remove_comments=True)
+# Renderer and output options of a transform worker process, set up once by _init_transform_worker
+_transform_state: dict = {}
 
-    # Read .csv file line by line
-    for i, csv_data in enumerate(csv_to_dict(csv_file), start=1):
-        # Create and save raw XML
-        raw_xml = dict_to_xml(csv_data)
 
-        # Transform raw XML with XSLT
-        transformed_xml = transform_xml(raw_xml, xslt_transform)
-        xml_root = etree.fromstring(str(transformed_xml), parser=parser)
-        tree = add_processing_instructions(etree.ElementTree(xml_root))
-        tree = add_warning_comment(tree, "WARNING!. This file was random generated.")
+def _init_transform_worker(xslt_file: str, renderer: str, pretty_print: bool) -> None:
+    _transform_state['render'] = create_renderer(xslt_file, renderer, pretty_print)
+    _transform_state['pretty_print'] = pretty_print
 
-        # Save CDA
-        save_xml(tree, os.path.join(cda_path, f'cda_{i}.xml'))
\ No newline at end of file
+
+def serialize_document(document: Document, pretty_print: bool = True) -> bytes:
+    """
+    Serialize a CDA document, unless it already is.
+
+    Args:
+        document (Document): The CDA document, as element tree or already serialized.
+        pretty_print (bool, optional): Flag to indicate whether to indent element trees. Defaults to True.
+
+    Returns:
+        bytes: The UTF-8 encoded document.
+    """
+    if isinstance(document, bytes):
+        return document
+    return etree.tostring(document, pretty_print=pretty_print, encoding='UTF-8')
+
+
+def _render_batch_in_worker(rows: List[dict]) -> List[bytes]:
+    # Serialized here, since only bytes can be sent back to the writer
+    return [serialize_document(_transform_state['render'](row), _transform_state['pretty_print']) for row in rows]
+
+
+def transform_rows(rows: Iterable[dict], xslt_file: str, workers: int = 1, batch_size: int = DEFAULT_BATCH_SIZE,
+                   pretty_print: bool = True, renderer: str = 'xslt') -> Iterator[Document]:
+    """
+    Transform rows to CDA documents, optionally in a pool of worker processes.
+
+    Each worker sets up the renderer once and transforms batches of batch_size rows. Documents are yielded in
+    row order, with at most two batches per worker transformed ahead of the consumer. Documents transformed in
+    this process are yielded as the renderer returns them, documents from workers as bytes.
+
+    Args:
+        rows (Iterable[dict]): The rows to transform, as dictionaries of field names and values.
+        xslt_file (str): The path to the XSLT file for transformation.
+        workers (int, optional): Number of worker processes. Defaults to 1, transforming in this process.
+        batch_size (int, optional): Number of rows sent to a worker at once. Defaults to DEFAULT_BATCH_SIZE.
+        pretty_print (bool, optional): Flag to indicate whether to indent serialized documents. Defaults to True.
+        renderer (str, optional): The engine rendering rows, one of RENDERERS. Defaults to 'xslt'.
+
+    Yields:
+        Document: The CDA document of every row.
+    """
+    # Set up in this process in any case, so that an invalid XSLT file fails before any worker starts
+    render = create_renderer(xslt_file, renderer, pretty_print)
+
+    if workers <= 1:
+        for row in rows:
+            yield render(row)
+        return
+
+    rows = iter(rows)
+    batches = iter(lambda: list(islice(rows, batch_size)), [])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_transform_worker,
+                             initargs=(xslt_file, renderer, pretty_print)) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(_render_batch_in_worker, batch))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def csv_to_cda(csv_file: str, xslt_file: str, output_dir: str, workers: int = 1, pretty_print: bool = True) -> None:
+    """
+    Convert a CSV file to CDA format using XSLT transformation and save the output.
+
+    Args:
+        csv_file (str): The path to the CSV file to convert.
+        xslt_file (str): The path to the XSLT file for transformation.
+        output_dir (str): The directory to save the output files.
+        workers (int, optional): Number of worker processes transforming rows. Defaults to 1.
+        pretty_print (bool, optional): Flag to indicate whether to indent the documents. Defaults to True.
+
+    Returns:
+        None
+    """
+    documents = transform_rows(csv_to_dict(csv_file), xslt_file, workers, pretty_print=pretty_print)
+    for i, document in enumerate(documents, start=1):
+        write_cda(document, output_dir, i, pretty_print)
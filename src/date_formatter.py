@@ -0,0 +1,149 @@
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATE_FORMAT = "%Y%m%d%H%M%S"
+
+# Date field and number of digits of each supported directive
+_DIRECTIVES = {
+    'Y': ('year', 4),
+    'm': ('month', 2),
+    'd': ('day', 2),
+    'H': ('hour', 2),
+    'M': ('minute', 2),
+    'S': ('second', 2),
+}
+# Directives from finest to coarsest with the datetime64 unit they resolve to
+_RESOLUTIONS = [('S', 's'), ('M', 'm'), ('H', 'h'), ('d', 'D'), ('m', 'M'), ('Y', 'Y')]
+_TOKEN_PATTERN = re.compile(r'%(.?)|([^%]+)')
+
+
+def _compile_format(date_format: str) -> Optional[List]:
+    """
+    Split a strftime format into numeric date fields and literal byte strings.
+
+    Args:
+        date_format (str): The strftime format to compile.
+
+    Returns:
+        Optional[List]: A list of (field, digits) tuples and literal bytes, or None if the format contains
+                     directives or characters that cannot be assembled from numeric date fields.
+    """
+    parts = []
+    for match in _TOKEN_PATTERN.finditer(date_format):
+        directive, literal = match.groups()
+        if directive is not None:
+            if directive == '%':
+                parts.append(b'%')
+            elif directive in _DIRECTIVES:
+                parts.append(_DIRECTIVES[directive])
+            else:
+                return None
+        else:
+            if not literal.isascii():
+                return None
+            parts.append(literal.encode('ascii'))
+    return parts
+
+
+def _split_fields(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Split datetime64[s] values into their calendar and clock fields.
+
+    Args:
+        values (np.ndarray): The datetime64[s] values, without NaT.
+
+    Returns:
+        Dict[str, np.ndarray]: int64 arrays for year, month, day, hour, minute and second.
+    """
+    days = values.astype('datetime64[D]')
+    months = values.astype('datetime64[M]')
+    seconds_of_day = (values - days).astype(np.int64)
+    return {
+        'year': values.astype('datetime64[Y]').astype(np.int64) + 1970,
+        'month': months.astype(np.int64) % 12 + 1,
+        'day': (days - months).astype(np.int64) + 1,
+        'hour': seconds_of_day // 3600,
+        'minute': seconds_of_day // 60 % 60,
+        'second': seconds_of_day % 60,
+    }
+
+
+def format_datetimes(values: np.ndarray, date_format: str) -> np.ndarray:
+    """
+    Format an array of datetime64 values with a strftime format in one vectorized step.
+
+    Formats built from %Y, %m, %d, %H, %M and %S are assembled as a byte matrix from the numeric date
+    fields. Any other format falls back to pandas' strftime. NaT values are formatted as ''.
+
+    Args:
+        values (np.ndarray): The datetime64 values to format.
+        date_format (str): The strftime format to apply.
+
+    Returns:
+        np.ndarray: A unicode string array with the formatted values.
+    """
+    values = np.asarray(values, dtype='datetime64[s]')
+    missing = np.isnat(values)
+    parts = _compile_format(date_format)
+    fields = _split_fields(np.where(missing, np.datetime64(0, 's'), values))
+    years = fields['year'][~missing]
+    if parts is None or (years.size and (years.min() < 1 or years.max() > 9999)):
+        formatted = pd.DatetimeIndex(values).strftime(date_format)
+        return np.where(missing, '', np.asarray(formatted, dtype=str))
+
+    columns = []
+    for part in parts:
+        if isinstance(part, bytes):
+            columns.append(np.broadcast_to(np.frombuffer(part, dtype=np.uint8), (len(values), len(part))))
+        else:
+            field, digits = part
+            powers = 10 ** np.arange(digits - 1, -1, -1, dtype=np.int64)
+            columns.append((fields[field][:, None] // powers % 10 + ord('0')).astype(np.uint8))
+    width = sum(column.shape[1] for column in columns)
+    if width == 0:
+        return np.full(len(values), '', dtype=str)
+
+    assembled = np.ascontiguousarray(np.concatenate(columns, axis=1)).view(f'S{width}').ravel()
+    formatted = assembled.astype(f'U{width}')
+    formatted[missing] = ''
+    return formatted
+
+
+def parse_datetimes(values: np.ndarray, date_format: str) -> np.ndarray:
+    """
+    Parse strings with a strftime format in one vectorized step. Empty strings are parsed as NaT.
+
+    Args:
+        values (np.ndarray): The strings to parse.
+        date_format (str): The strftime format of the strings.
+
+    Returns:
+        np.ndarray: The parsed datetime64[s] values.
+
+    Raises:
+        ValueError: If a non-empty value does not match the format.
+    """
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), format=date_format)
+    return parsed.to_numpy(dtype='datetime64[s]')
+
+
+def truncate_datetimes(values: np.ndarray, date_format: str) -> np.ndarray:
+    """
+    Truncate datetime64 values to the finest field of a format, as formatting and parsing them again would.
+
+    Args:
+        values (np.ndarray): The datetime64 values.
+        date_format (str): The strftime format.
+
+    Returns:
+        np.ndarray: The truncated datetime64[s] values.
+    """
+    values = np.asarray(values, dtype='datetime64[s]')
+    parts = _compile_format(date_format) or []
+    for directive, unit in _RESOLUTIONS:
+        if _DIRECTIVES[directive] in parts:
+            return values.astype(f'datetime64[{unit}]').astype('datetime64[s]')
+    return values
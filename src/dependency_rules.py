@@ -0,0 +1,413 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from enum import Enum
+from graphlib import CycleError, TopologicalSorter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import toml
+
+from date_formatter import DEFAULT_DATE_FORMAT, parse_datetimes, truncate_datetimes
+from table_format import date_formats
+from value_set_cache import value_set_cache
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'resources',
+                                  'dependency_rules.toml')
+
+
+def _integers(column: pd.Series) -> np.ndarray:
+    """
+    Get a column of integers or integer strings as an int64 array.
+
+    Raises:
+        ValueError: If a value is missing or not an integer.
+    """
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy(dtype=np.int64)
+    return column.to_numpy().astype(np.int64)
+
+
+def _map_distinct(column: pd.Series, mapper: Callable[[np.ndarray], np.ndarray]) -> pd.Categorical:
+    """
+    Apply a vectorized mapping to the distinct values of a column only and spread the results over its rows.
+
+    Args:
+        column (pd.Series): The column to map.
+        mapper (Callable): Maps an array of distinct values, as strings, to an array of results.
+
+    Returns:
+        pd.Categorical: The mapped column.
+    """
+    codes, distinct = pd.factorize(column, use_na_sentinel=False)
+    mapped = np.asarray(mapper(np.asarray(distinct, dtype=object).astype(str)), dtype=str)
+    categories, inverse = np.unique(mapped, return_inverse=True)
+    return pd.Categorical.from_codes(inverse[codes], categories, validate=False)
+
+
+def _fill_value(column: pd.Series, value: str) -> Any:
+    """
+    Convert a value from a rules file to the storage type of the column it is written to.
+
+    Returns:
+        Any: The converted value.
+    """
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return pd.Series([value]).astype(column.dtype).iloc[0]
+    return value
+
+
+class RuleType(Enum):
+    """
+    Enum representing the different kinds of dependency rules.
+    """
+    ADD_MINUTES = 'add_minutes'
+    SUM = 'sum'
+    SET_WHERE = 'set_where'
+    COPY = 'copy'
+    MAP_VALUES = 'map_values'
+    LOOKUP_JOIN = 'lookup_join'
+
+
+class AbstractRule(ABC):
+    """
+    A dependency rule that computes one column of a chunk from other columns in one vectorized step.
+    """
+
+    def __init__(self, output: str, name: Optional[str] = None) -> None:
+        """
+        Initialize the rule.
+
+        Args:
+            output (str): The column the rule writes.
+            name (str, optional): A name for log messages. Defaults to the kind and output of the rule.
+        """
+        self.output = output
+        self.name = name or f"{self.kind.value} -> {output}"
+
+    @property
+    @abstractmethod
+    def kind(self) -> RuleType:
+        pass
+
+    @property
+    @abstractmethod
+    def inputs(self) -> List[str]:
+        """
+        Get the columns the rule reads.
+
+        Returns:
+            List[str]: The column names.
+        """
+        pass
+
+    @abstractmethod
+    def apply(self, df: pd.DataFrame) -> None:
+        """
+        Apply the rule to a chunk in place.
+
+        Args:
+            df (pd.DataFrame): The chunk of generated rows.
+        """
+        pass
+
+
+class AddMinutesRule(AbstractRule):
+    """
+    output = timestamp + minutes, serialized with format_out.
+
+    The timestamp is either a datetime64 column or text in format_in. The result is kept as datetime64, truncated
+    to the resolution of format_out, as parsing the formatted text again would.
+    """
+    kind = RuleType.ADD_MINUTES
+
+    def __init__(self, output: str, timestamp: str, minutes: str, format_in: str = DEFAULT_DATE_FORMAT,
+                 format_out: str = DEFAULT_DATE_FORMAT, name: Optional[str] = None) -> None:
+        super().__init__(output, name)
+        self.timestamp = timestamp
+        self.minutes = minutes
+        self.format_in = format_in
+        self.format_out = format_out
+
+    @property
+    def inputs(self) -> List[str]:
+        return [self.timestamp, self.minutes]
+
+    def apply(self, df: pd.DataFrame) -> None:
+        formats = date_formats(df)
+        column = df[self.timestamp]
+        if pd.api.types.is_datetime64_dtype(column.dtype):
+            # A timestamp only holds the fields its serialization format shows
+            start = truncate_datetimes(column.to_numpy(), formats.get(self.timestamp, self.format_in))
+        else:
+            start = parse_datetimes(column.to_numpy(), self.format_in)
+        minutes = _integers(df[self.minutes]).astype('timedelta64[m]')
+        df[self.output] = truncate_datetimes(start + minutes, self.format_out)
+        formats[self.output] = self.format_out
+
+
+class SumRule(AbstractRule):
+    """
+    output = the sum of integer columns.
+    """
+    kind = RuleType.SUM
+
+    def __init__(self, output: str, columns: List[str], name: Optional[str] = None) -> None:
+        super().__init__(output, name)
+        if not columns:
+            raise ValueError(f"Rule '{self.name}' needs at least one column to sum")
+        self.columns = list(columns)
+
+    @property
+    def inputs(self) -> List[str]:
+        return self.columns
+
+    def apply(self, df: pd.DataFrame) -> None:
+        df[self.output] = sum(_integers(df[column]) for column in self.columns)
+
+
+class SetWhereRule(AbstractRule):
+    """
+    output = value in all rows where column equals a given value, unchanged elsewhere.
+    """
+    kind = RuleType.SET_WHERE
+
+    def __init__(self, output: str, column: str, equals: str, value: str, name: Optional[str] = None) -> None:
+        super().__init__(output, name)
+        self.column = column
+        self.equals = equals
+        self.value = value
+
+    @property
+    def inputs(self) -> List[str]:
+        return [self.column]
+
+    def apply(self, df: pd.DataFrame) -> None:
+        output = df[self.output]
+        if isinstance(output.dtype, pd.CategoricalDtype) and self.value not in output.cat.categories:
+            df[self.output] = output.cat.add_categories([self.value])
+        df.loc[df[self.column] == self.equals, self.output] = _fill_value(output, self.value)
+
+
+class CopyRule(AbstractRule):
+    """
+    output = column.
+    """
+    kind = RuleType.COPY
+
+    def __init__(self, output: str, column: str, name: Optional[str] = None) -> None:
+        super().__init__(output, name)
+        self.column = column
+
+    @property
+    def inputs(self) -> List[str]:
+        return [self.column]
+
+    def apply(self, df: pd.DataFrame) -> None:
+        df[self.output] = df[self.column]
+
+
+class MapValuesRule(AbstractRule):
+    """
+    output = values[column], or default for values not in the mapping. Without a default they are kept.
+    """
+    kind = RuleType.MAP_VALUES
+
+    def __init__(self, output: str, column: str, values: Dict[str, str], default: Optional[str] = None,
+                 name: Optional[str] = None) -> None:
+        super().__init__(output, name)
+        self.column = column
+        self.values = {str(key): str(value) for key, value in values.items()}
+        self.default = default
+
+    @property
+    def inputs(self) -> List[str]:
+        return [self.column]
+
+    def apply(self, df: pd.DataFrame) -> None:
+        def map_values(distinct: np.ndarray) -> np.ndarray:
+            mapped = pd.Series(distinct).map(self.values)
+            return mapped.fillna(self.default if self.default is not None else pd.Series(distinct)).to_numpy()
+
+        df[self.output] = _map_distinct(df[self.column], map_values)
+
+
+class LookupJoinRule(AbstractRule):
+    """
+    output = value_column of the value set row whose key_column equals column, '' if there is none.
+
+    The value set is joined through its cached index, see ValueSetCache.index.
+    """
+    kind = RuleType.LOOKUP_JOIN
+
+    def __init__(self, output: str, column: str, link: str, key_column: str, value_column: str,
+                 name: Optional[str] = None) -> None:
+        super().__init__(output, name)
+        self.column = column
+        self.link = link
+        self.key_column = key_column
+        self.value_column = value_column
+        if not os.path.isfile(link):
+            raise ValueError(f"File '{link}' of rule '{self.name}' does not exist.")
+
+    @property
+    def inputs(self) -> List[str]:
+        return [self.column]
+
+    def apply(self, df: pd.DataFrame) -> None:
+        index = value_set_cache.index(self.link, self.key_column)
+        df[self.output] = _map_distinct(df[self.column], lambda distinct: index.lookup(distinct, self.value_column))
+
+
+class RuleFactory:
+    """
+    Factory class to create rule instances based on the rule kind.
+    """
+    _rule_map: Dict[RuleType, AbstractRule] = {
+        RuleType.ADD_MINUTES: AddMinutesRule,
+        RuleType.SUM: SumRule,
+        RuleType.SET_WHERE: SetWhereRule,
+        RuleType.COPY: CopyRule,
+        RuleType.MAP_VALUES: MapValuesRule,
+        RuleType.LOOKUP_JOIN: LookupJoinRule,
+    }
+
+    @classmethod
+    def create_rule(cls, params: dict) -> AbstractRule:
+        """
+        Create a rule instance from its declaration.
+
+        Args:
+            params (dict): The rule declaration, with its kind under 'kind' and the rule's parameters.
+
+        Returns:
+            AbstractRule: An instance of the rule corresponding to the declared kind.
+
+        Raises:
+            ValueError: If the kind is unknown or the parameters do not fit it.
+        """
+        params = dict(params)
+        kind = params.pop('kind', None)
+        try:
+            rule_class = cls._rule_map[RuleType(kind)]
+        except ValueError:
+            kinds = ', '.join(rule_type.value for rule_type in RuleType)
+            raise ValueError(f"Unknown rule kind '{kind}' for output '{params.get('output')}'. "
+                             f"Expected one of: {kinds}")
+
+        try:
+            return rule_class(**params)
+        except TypeError as e:
+            raise ValueError(f"Invalid parameters for rule kind '{rule_class.kind.value}': {str(e)}")
+
+
+class RuleSet:
+    """
+    Dependency rules declared in a TOML file, applied to chunks of generated rows.
+
+    Rules are ordered topologically by the columns they read and write, so a rule runs after every rule that
+    writes one of its inputs. Rules writing the same column keep their declaration order. Rules whose inputs
+    or output are not columns of the chunk are skipped.
+    """
+
+    def __init__(self, rules: List[AbstractRule]) -> None:
+        """
+        Initialize the RuleSet and check that the rules can be ordered.
+
+        Args:
+            rules (List[AbstractRule]): The rules in declaration order.
+
+        Raises:
+            ValueError: If the rules depend on each other in a cycle.
+        """
+        self.rules = rules
+        self._orders: Dict[Tuple[str, ...], List[AbstractRule]] = {}
+        self.order([column for rule in rules for column in rule.inputs + [rule.output]])
+
+    @classmethod
+    def from_file(cls, path: str) -> 'RuleSet':
+        """
+        Load the rules declared as [[rule]] tables in a TOML file. Links are relative to the file's directory.
+
+        Args:
+            path (str): The path to the TOML file.
+
+        Returns:
+            RuleSet: The loaded rules.
+
+        Raises:
+            ValueError: If the file does not exist or declares invalid rules.
+        """
+        if not os.path.isfile(path):
+            raise ValueError(f"File '{path}' does not exist.")
+        try:
+            declarations = toml.load(path).get('rule', [])
+        except toml.TomlDecodeError as e:
+            raise ValueError(f"Invalid rules file '{path}': {str(e)}")
+        for declaration in declarations:
+            if 'link' in declaration:
+                declaration['link'] = os.path.join(os.path.dirname(path), declaration['link'])
+        return cls([RuleFactory.create_rule(declaration) for declaration in declarations])
+
+    def order(self, columns: List[str]) -> List[AbstractRule]:
+        """
+        Get the rules that apply to a set of columns in the order they have to run.
+
+        Args:
+            columns (List[str]): The columns of the chunks the rules are applied to.
+
+        Returns:
+            List[AbstractRule]: The applicable rules in dependency order.
+
+        Raises:
+            ValueError: If the applicable rules depend on each other in a cycle.
+        """
+        key = tuple(columns)
+        if key in self._orders:
+            return self._orders[key]
+
+        available = set(columns)
+        rules = []
+        for rule in self.rules:
+            missing = [column for column in rule.inputs + [rule.output] if column not in available]
+            if missing:
+                logging.info(f"Skipping dependency rule '{rule.name}', missing columns: {', '.join(missing)}")
+            else:
+                rules.append(rule)
+
+        sorter = TopologicalSorter()
+        for i, rule in enumerate(rules):
+            sorter.add(i)
+            for j, earlier in enumerate(rules[:i]):
+                if earlier.output in rule.inputs or earlier.output == rule.output:
+                    sorter.add(i, j)
+                if rule.output in earlier.inputs:
+                    sorter.add(j, i)
+        try:
+            sorter.prepare()
+        except CycleError as e:
+            raise ValueError(f"Dependency rules form a cycle: {', '.join(rules[i].name for i in e.args[1])}")
+
+        ordered = []
+        while sorter.is_active():
+            ready = sorted(sorter.get_ready())
+            ordered.extend(rules[i] for i in ready)
+            sorter.done(*ready)
+
+        self._orders[key] = ordered
+        return ordered
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply the rules to a chunk of generated rows in place.
+
+        Args:
+            df (pd.DataFrame): The chunk of generated rows, typed or as text.
+
+        Returns:
+            pd.DataFrame: The updated DataFrame.
+        """
+        for rule in self.order([str(column) for column in df.columns]):
+            rule.apply(df)
+        return df
@@ -1,9 +1,22 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
 import pandas as pd
 
 from generator import GeneratorFactory
 from generator import GeneratorType
 from config_parser import ConfigParser
-from value_remover import ValueRemover
+from date_formatter import DEFAULT_DATE_FORMAT
+from random_streams import BLOCK_SIZE, RandomStreams
+from table_format import date_formats, table_to_text
+from value_remover import Column, ValueRemover
+from value_set_cache import value_set_cache
+
+# A multiple of the random stream block size, so chunks do not split blocks
+DEFAULT_CHUNK_SIZE = 16 * BLOCK_SIZE
 
 
 def extract_concept_id_attributes(input_df: pd.DataFrame) -> dict:
@@ -24,13 +37,14 @@ def extract_concept_id_attributes(input_df: pd.DataFrame) -> dict:
     return variables_dict
 
 
-def parse_parameters_to_dict(variables_dict: dict) -> dict:
+def parse_parameters_to_dict(variables_dict: dict, base_dir: str = '') -> dict:
     """
     Parse the parameters in the variables dictionary to a dictionary format.
 
     Args:
         variables_dict (dict): A dictionary where the keys are concept IDs and the values are tuples containing
                                default values, generation type, parameters, and null flavors.
+        base_dir (str, optional): The directory linked value sets are relative to. Defaults to the working directory.
 
     Returns:
         dict: A dictionary with the same keys, where the parameters are parsed into a dictionary format if they are strings.
@@ -38,7 +52,7 @@ def parse_parameters_to_dict(variables_dict: dict) -> dict:
     variables_dict = {
         concept_id: (
             var_type,
-            ConfigParser.parse(params) if isinstance(params, str) else {},
+            ConfigParser.parse(params, base_dir) if isinstance(params, str) else {},
             nullable,
             prob_missing
         )
@@ -47,26 +61,151 @@ def parse_parameters_to_dict(variables_dict: dict) -> dict:
     return variables_dict
 
 
-def generate_data_columns(variables_dict: dict, num_datasets: int) -> pd.DataFrame:
-    output_data = pd.DataFrame()
+def create_generators(variables_dict: dict, streams: RandomStreams) -> dict:
+    """
+    Create a generator for every generated concept ID, bound to the concept ID's random stream.
+
+    Args:
+        variables_dict (dict): A dictionary where the keys are concept IDs and the values are tuples containing
+                               generation type, parsed parameters, nullable flag and probability missing.
+        streams (RandomStreams): The random streams to draw from.
 
+    Returns:
+        dict: A dictionary mapping concept IDs to bound generators, in plan order.
+    """
+    generators = {}
     for concept_id, (var_type, params, _, _) in variables_dict.items():
         if var_type == 'empty':
             continue
+        generator = GeneratorFactory.create_generator(GeneratorType(var_type), params)
+        generators[concept_id] = generator.bind(streams, concept_id)
+    return generators
+
+
+def generate_data_columns(generators: dict, count: int) -> Dict[str, Column]:
+    """
+    Generate the next chunk of data columns of all concept IDs.
+
+    The columns are collected as typed arrays in plan order. Building a table from them is left to the caller,
+    so the table is allocated once instead of growing one column at a time.
+
+    Args:
+        generators (dict): The bound generators as returned by create_generators.
+        count (int): Number of rows to generate.
+
+    Returns:
+        Dict[str, Column]: The generated column arrays by concept ID.
+    """
+    columns = {}
+
+    for concept_id, generator in generators.items():
+        # Generate data column, linked concept IDs (e.g. dependent lookup columns) share the sampled rows
+        values = generator.generate_chunk(count)
+        if not isinstance(values, tuple):
+            values = (values,)
+
+        for output_id, column in zip([concept_id] + generator.linked_concept_ids, values):
+            columns[output_id] = column
+
+    return columns
+
+
+def generate_rows(variables_dict: dict, generators: dict, streams: RandomStreams, start: int,
+                  count: int) -> Dict[str, Column]:
+    """
+    Generate the data columns of a row range and remove values with the configured probabilities.
 
-        # Generate data column
-        column_list = GeneratorFactory.create_generator(GeneratorType(var_type), params).generate(num_datasets)
+    Args:
+        variables_dict (dict): A dictionary where the keys are concept IDs and the values are tuples containing
+                               generation type, parsed parameters, nullable flag and probability missing.
+        generators (dict): The bound generators as returned by create_generators.
+        streams (RandomStreams): The random streams the generators are bound to.
+        start (int): The row number of the first row.
+        count (int): Number of rows to generate.
+
+    Returns:
+        Dict[str, Column]: The column arrays by concept ID.
+    """
+    for generator in generators.values():
+        generator.seek(start)
+
+    # Generate data columns
+    columns = generate_data_columns(generators, count)
+
+    # Remove value with probability
+    return ValueRemover.process_columns(columns, variables_dict, count, streams, start)
 
-        if 'dependent_concept_id_1' in params:
-            new_df = pd.DataFrame.from_records(column_list, columns=[concept_id, params['dependent_concept_id_1']])
-            if new_df.columns.intersection(output_data.columns).any():
-                output_data.update(new_df)
-            else:
-                output_data = pd.concat([output_data, new_df], axis=1)
-        else:
-            output_data[concept_id] = pd.Series(column_list)
 
-    return output_data
+# Generators of a worker process, created once by _init_worker
+_worker_state: dict = {}
+
+
+def _init_worker(variables_dict: dict, seed: int, block_size: int, snapshot_dir: str) -> None:
+    """
+    Create the generators of a worker process.
+
+    Value sets are loaded through the worker's value set cache, i.e. memory-mapped from the snapshots the parent
+    process wrote, instead of being pickled.
+    """
+    value_set_cache.configure(snapshot_dir=snapshot_dir)
+    streams = RandomStreams(seed, block_size)
+    _worker_state['variables_dict'] = variables_dict
+    _worker_state['streams'] = streams
+    _worker_state['generators'] = create_generators(variables_dict, streams)
+
+
+def _generate_rows_in_worker(start: int, count: int) -> Dict[str, Column]:
+    return generate_rows(_worker_state['variables_dict'], _worker_state['generators'], _worker_state['streams'],
+                         start, count)
+
+
+def generate_chunks(
+        variables_dict: dict,
+        streams: RandomStreams,
+        num_datasets: int,
+        chunk_size: int,
+        workers: int = 1,
+        start: int = 0
+) -> Iterator[Tuple[int, Dict[str, Column]]]:
+    """
+    Generate all rows chunk by chunk, optionally in a pool of worker processes.
+
+    Chunks are yielded in order. With several workers, at most two chunks per worker are generated ahead of the
+    consumer. Since every row only depends on the seed, the result is identical for any number of workers.
+
+    Args:
+        variables_dict (dict): A dictionary where the keys are concept IDs and the values are tuples containing
+                               generation type, parsed parameters, nullable flag and probability missing.
+        streams (RandomStreams): The random streams to draw from.
+        num_datasets (int): Number of rows to generate.
+        chunk_size (int): Number of rows per chunk.
+        workers (int, optional): Number of worker processes. Defaults to 1, generating in this process.
+        start (int, optional): The row number to start at, e.g. to resume a run. Defaults to 0.
+
+    Yields:
+        Tuple[int, Dict[str, Column]]: The row number of the first row of the chunk and its column arrays.
+    """
+    # Created in this process in any case, which validates the plan and writes value set snapshots for the workers
+    generators = create_generators(variables_dict, streams)
+    chunks = ((first, min(chunk_size, num_datasets - first)) for first in range(start, num_datasets, chunk_size))
+
+    if workers <= 1:
+        for start, count in chunks:
+            yield start, generate_rows(variables_dict, generators, streams, start, count)
+        return
+
+    initargs = (variables_dict, streams.seed, streams.block_size, value_set_cache.snapshot_dir)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        pending = deque()
+        for start, count in chunks:
+            pending.append((start, executor.submit(_generate_rows_in_worker, start, count)))
+            if len(pending) >= 2 * workers:
+                start, future = pending.popleft()
+                yield start, future.result()
+        while pending:
+            start, future = pending.popleft()
+            yield start, future.result()
+
 
 def validate_excel_columns(input_df: pd.DataFrame) -> None:
     """
@@ -84,21 +223,72 @@ def validate_excel_columns(input_df: pd.DataFrame) -> None:
             raise ValueError(f"Missing required column: {column}")
 
 
-def generate_csv(excel_path: str, csv_path: str, num_datasets: int) -> None:
+def to_table(columns: Dict[str, Column], formats: Optional[Dict[str, str]] = None) -> pd.DataFrame:
     """
-    Generate a CSV file from an Excel input file.
+    Build a table from generated columns, keeping their storage types.
+
+    Integers keep the smallest type holding their range, vocabularies are stored as categoricals, dates as
+    datetime64 values and removed values are missing values of the column's type.
 
     Args:
-        excel_path (str): Path to the input Excel file.
-        csv_path (str): Path to the output CSV file.
-        num_datasets (int, optional): Number of datasets to generate. Defaults to 1.
+        columns (Dict[str, Column]): The generated columns.
+        formats (Dict[str, str], optional): The serialization format of every date column.
 
     Returns:
-        None
+        pd.DataFrame: The table with one column per generated column.
+    """
+    table = pd.DataFrame(columns, copy=False)
+    date_formats(table).update(formats or {})
+    return table
+
+
+def extract_date_formats(variables_dict: dict) -> Dict[str, str]:
+    """
+    Get the format every date concept ID is serialized in.
+
+    Args:
+        variables_dict (dict): A dictionary where the keys are concept IDs and the values are tuples containing
+                               generation type, parsed parameters, nullable flag and probability missing.
+
+    Returns:
+        Dict[str, str]: The strftime format by concept ID.
+    """
+    return {concept_id: params.get('date_format', DEFAULT_DATE_FORMAT)
+            for concept_id, (var_type, params, _, _) in variables_dict.items()
+            if var_type == GeneratorType.DATE.value}
+
+
+def generate_tables(
+        excel_path: str,
+        num_datasets: int,
+        seed: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        workers: int = 1,
+        start: int = 0
+) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """
+    Generate the rows described by an Excel input file as in-memory tables, one chunk at a time.
+
+    Peak memory depends on chunk_size and not on num_datasets. The generated rows do not depend on chunk_size.
+
+    Args:
+        excel_path (str): Path to the input Excel file.
+        num_datasets (int): Number of datasets to generate.
+        seed (int, optional): Seed for all random streams. Defaults to fresh entropy, which is logged.
+        chunk_size (int, optional): Number of rows generated per chunk. Defaults to DEFAULT_CHUNK_SIZE.
+        workers (int, optional): Number of worker processes generating chunks. Defaults to 1.
+        start (int, optional): The row number to start at. The rows before it are skipped, the others are the
+                               same as in a run from the first row. Defaults to 0.
+
+    Yields:
+        Tuple[int, pd.DataFrame]: The row number of the first row of the chunk and the chunk as a typed table.
     """
     if num_datasets < 1:
         raise ValueError("Number of datasets must be greater than 0.")
-
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be greater than 0.")
+    if not 0 <= start <= num_datasets:
+        raise ValueError("Start row must be between 0 and the number of datasets.")
 
     excel_input = pd.read_excel(excel_path)
 
@@ -109,13 +299,40 @@ def generate_csv(excel_path: str, csv_path: str, num_datasets: int) -> None:
     variables_dict = extract_concept_id_attributes(excel_input)
 
     # Parse parameters inside dictionary (Parameters now in dictionary format)
-    variables_dict = parse_parameters_to_dict(variables_dict)
+    variables_dict = parse_parameters_to_dict(variables_dict, os.path.dirname(excel_path))
 
-    # Generate data columns
-    output_data = generate_data_columns(variables_dict, num_datasets)
+    streams = RandomStreams(seed)
+    if seed is None:
+        logging.info(f"Using random seed {streams.seed}")
 
-    # Remove value with probability
-    output_data = ValueRemover.process_df(output_data, variables_dict)
+    formats = extract_date_formats(variables_dict)
+    for first, columns in generate_chunks(variables_dict, streams, num_datasets, chunk_size, workers, start):
+        yield first, to_table(columns, formats)
+
+
+def generate_csv(
+        excel_path: str,
+        csv_path: str,
+        num_datasets: int,
+        seed: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        workers: int = 1
+) -> None:
+    """
+    Generate a CSV file from an Excel input file.
+
+    Rows are generated and appended to the CSV file one chunk at a time, see generate_tables.
 
-    # Output to CSV
-    output_data.to_csv(csv_path, index=False)
+    Args:
+        excel_path (str): Path to the input Excel file.
+        csv_path (str): Path to the output CSV file.
+        num_datasets (int, optional): Number of datasets to generate. Defaults to 1.
+        seed (int, optional): Seed for all random streams. Defaults to fresh entropy, which is logged.
+        chunk_size (int, optional): Number of rows generated per chunk. Defaults to DEFAULT_CHUNK_SIZE.
+        workers (int, optional): Number of worker processes generating chunks. Defaults to 1.
+
+    Returns:
+        None
+    """
+    for start, output_data in generate_tables(excel_path, num_datasets, seed, chunk_size, workers):
+        table_to_text(output_data).to_csv(csv_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
@@ -1,14 +1,23 @@
-import os
-import random
-import uuid
+import re
 from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
+from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Union
 
-import exrex
+import numpy as np
 import pandas as pd
 
+from date_formatter import DEFAULT_DATE_FORMAT
+from index_sampler import IndexSampler
+from random_streams import RandomStreams
+from regex_sampler import RegexSampler, compile_regex
+from value_set_cache import value_set_cache
+
+# Range of dates generated if a date column sets no start_date or end_date. Fixed, so that runs with the same seed
+# produce the same dates on any day
+DEFAULT_START_DATE = datetime(2000, 1, 1)
+DEFAULT_END_DATE = datetime(2024, 7, 30)
+
 
 class GeneratorType(Enum):
     """
@@ -23,16 +32,118 @@ class GeneratorType(Enum):
 
 
 class AbstractGenerator(ABC):
+    # Concept IDs that are filled together with the generator's own concept ID, sharing the same rows
+    linked_concept_ids: List[str] = []
+    _streams: Optional[RandomStreams] = None
+    _stream_key: Optional[str] = None
+    _position: int = 0
+
     @abstractmethod
-    def generate(self, count: int) -> List[Any]:
+    def generate(self, count: int, rng: Optional[np.random.Generator] = None) -> Union[np.ndarray, List[Any], tuple]:
+        """
+        Generate a batch of random values.
+
+        Args:
+            count (int): The number of values to generate.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
+
+        Returns:
+            Union[np.ndarray, List[Any], tuple]: The generated values, or a tuple with one array per concept ID
+                                                 if the generator has linked concept IDs.
+        """
+        pass
+
+    @staticmethod
+    def _resolve_rng(rng: Optional[np.random.Generator]) -> np.random.Generator:
+        """
+        Return the given random generator or a freshly seeded one if none is given.
+
+        Args:
+            rng (np.random.Generator, optional): The random generator passed by the caller.
+
+        Returns:
+            np.random.Generator: The random generator to draw from.
+        """
+        return rng if rng is not None else np.random.default_rng()
+
+    def bind(self, streams: RandomStreams, key: str) -> 'AbstractGenerator':
+        """
+        Bind the generator to a random stream and rewind it to the first row.
+
+        Args:
+            streams (RandomStreams): The random streams to draw from.
+            key (str): The key of the stream, usually the concept ID.
+
+        Returns:
+            AbstractGenerator: The generator itself.
+        """
+        self._streams = streams
+        self._stream_key = key
+        self._position = 0
+        return self
+
+    def seek(self, position: int) -> None:
+        """
+        Move the bound stream to a row, so that the next chunk starts with that row.
+
+        Args:
+            position (int): The row number of the next generated value.
         """
-        Generate a list of random values.
+        self._position = position
+
+    def generate_chunk(self, count: int) -> Union[np.ndarray, tuple]:
+        """
+        Generate the next rows of the bound stream.
+
+        Consecutive chunks continue where the previous chunk ended, and the values of a row do not depend on
+        how the rows are split into chunks. Generators with vocabularies return categoricals.
 
         Args:
             count (int): The number of values to generate.
 
         Returns:
-            List[Any]: A list of generated values.
+            Union[np.ndarray, pd.Categorical, tuple]: The generated values, shaped like the return value of generate.
+
+        Raises:
+            RuntimeError: If the generator is not bound to a random stream.
+        """
+        if self._streams is None:
+            raise RuntimeError("Generator must be bound to a random stream before generating chunks")
+        start, stop = self._position, self._position + count
+        self._position = stop
+        vocabularies = self.vocabularies if isinstance(self, VocabularyGenerator) else None
+        if vocabularies is None:
+            return self._streams.draw(self._stream_key, self.generate, start, stop)
+
+        rows = self._streams.draw(self._stream_key, self.sample_indices, start, stop)
+        columns = tuple(pd.Categorical.from_codes(codes[rows], categories, validate=False)
+                        for categories, codes in vocabularies)
+        return columns if len(columns) > 1 else columns[0]
+
+
+class VocabularyGenerator(AbstractGenerator):
+    """
+    Base class of generators sampling rows of a closed vocabulary.
+
+    The vocabularies give (categories, code of every vocabulary row) per generated column, so that chunks are
+    generated as categoricals from the indices returned by sample_indices. A generator whose configuration has no
+    closed vocabulary leaves them None and generates its chunks with generate.
+    """
+    vocabularies: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+
+    @abstractmethod
+    def sample_indices(self, count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Sample rows of the vocabulary.
+
+        generate draws exactly these rows from the same random generator, so both give the same values.
+
+        Args:
+            count (int): The number of rows to sample.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
+
+        Returns:
+            np.ndarray: The sampled row indices.
         """
         pass
 
@@ -46,41 +157,36 @@ class DateGenerator(AbstractGenerator):
             self,
             start_date: Optional[datetime] = None,
             end_date: Optional[datetime] = None,
-            date_format: str = "%Y%m%d%H%M%S"
+            date_format: str = DEFAULT_DATE_FORMAT
     ) -> None:
         """
         Initialize the DateGenerator with optional parameters.
 
         Args:
-            start_date (datetime, optional): The start date for the range. Defaults to January 1, 2000.
-            end_date (datetime, optional): The end date for the range. Defaults to today.
-            date_format (str, optional): The format of the generated date strings. Defaults to "%Y%m%d%H%M%S".
+            start_date (datetime, optional): The start date for the range. Defaults to DEFAULT_START_DATE.
+            end_date (datetime, optional): The end date for the range. Defaults to DEFAULT_END_DATE.
+            date_format (str, optional): The format the dates are serialized in. Defaults to "%Y%m%d%H%M%S".
         """
-        self.start_date = start_date if start_date else datetime(2000, 1, 1)
-        self.end_date = end_date if end_date else datetime.today()
+        self.start_date = start_date if start_date else DEFAULT_START_DATE
+        self.end_date = end_date if end_date else DEFAULT_END_DATE
         self.format = date_format
 
-    def _get_random_date(self) -> datetime:
+    def generate(self, count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
         """
-        Get a random date within the specified range.
+        Generate random dates within the specified range.
 
-        Returns:
-            datetime: A random date within the specified range.
-        """
-        return self.start_date + timedelta(
-            seconds=random.randint(0, int((self.end_date - self.start_date).total_seconds())))
-
-    def generate(self, count: int) -> List[str]:
-        """
-        Generate random dates within the specified range and format.
+        The dates are kept as datetime64 values and only formatted with date_format when the rows are serialized.
 
         Args:
             count (int): The number of dates to generate.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
 
         Returns:
-            List[str]: A list of randomly generated date strings.
+            np.ndarray: A datetime64[s] array of randomly generated dates.
         """
-        return [self._get_random_date().strftime(self.format) for _ in range(count)]
+        span = int((self.end_date - self.start_date).total_seconds())
+        offsets = self._resolve_rng(rng).integers(0, span, size=count, endpoint=True, dtype=np.int64)
+        return np.datetime64(self.start_date.replace(microsecond=0), 's') + offsets.astype('timedelta64[s]')
 
 
 class FloatGenerator(AbstractGenerator):
@@ -106,17 +212,19 @@ class FloatGenerator(AbstractGenerator):
         self.max_value = max_value
         self.precision = precision
 
-    def generate(self, count: int) -> List[float]:
+    def generate(self, count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
         """
         Generate random float values within the specified range and precision.
 
         Args:
             count (int): The number of float values to generate.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
 
         Returns:
-            List[float]: A list of randomly generated float values.
+            np.ndarray: A float64 array of randomly generated values, rounded to the configured precision.
         """
-        return [round(random.uniform(self.min_value, self.max_value), self.precision) for _ in range(count)]
+        values = self._resolve_rng(rng).uniform(self.min_value, self.max_value, size=count)
+        return np.round(values, self.precision)
 
 
 class IntGenerator(AbstractGenerator):
@@ -138,29 +246,39 @@ class IntGenerator(AbstractGenerator):
         """
         self.min_value = min_value
         self.max_value = max_value
+        # Smallest integer type holding the whole range
+        self.dtype = next(dtype for dtype in (np.int8, np.int16, np.int32, np.int64)
+                          if np.iinfo(dtype).min <= min_value and max_value <= np.iinfo(dtype).max)
 
-    def generate(self, count: int) -> List[int]:
+    def generate(self, count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
         """
         Generate random integer values within the specified range.
 
         Args:
             count (int): The number of integer values to generate.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
 
         Returns:
-            List[int]: A list of randomly generated integer values.
+            np.ndarray: An array of randomly generated values of the smallest integer type holding the range.
         """
-        return [random.randint(self.min_value, self.max_value) for _ in range(count)]
+        # Always drawn as int64, so that the values do not depend on the storage type
+        return self._resolve_rng(rng).integers(self.min_value, self.max_value, size=count, endpoint=True,
+                                               dtype=np.int64).astype(self.dtype)
 
 
-class LookupGenerator(AbstractGenerator):
+class LookupGenerator(VocabularyGenerator):
     """
-    Generator for random values from a specified column in a CSV file.
+    Generator for random rows of a CSV file.
+
+    The values of the main column fill the generator's own concept ID. Any number of dependent columns, given as
+    dependent_column_N with the concept ID to fill as dependent_concept_id_N, are taken from the same sampled row.
     """
 
     def __init__(
             self,
             link: Optional[str] = None,
             column: Optional[str] = None,
+            weight: Optional[str] = None,
             **kwargs: Dict[str, Any]
     ) -> None:
         """
@@ -169,54 +287,95 @@ class LookupGenerator(AbstractGenerator):
         Args:
             link (str, optional): The path to the CSV file. Defaults to None.
             column (str, optional): The column name in the CSV file to use for the value set. Defaults to None.
+            weight (str, optional): The column name in the CSV file holding a frequency per row. Rows are drawn
+                                    uniformly if not set.
+            **kwargs: Numbered dependent_column_N and dependent_concept_id_N pairs.
+
+        Raises:
+            ValueError: If a dependent column has no concept ID or the other way round.
         """
         self.link = link
         self.column = column
-        # TODO Catch other dependent columns
-        self.dependent_columns = kwargs.get('dependent_column_1', None)
-        self.dependent_concept_id = kwargs.get('dependent_concept_id_1', None)
+        self.weight = weight
+        self.dependent_columns, self.dependent_concept_ids = self._parse_dependent_columns(kwargs)
+        self.linked_concept_ids = self.dependent_concept_ids
         self._load_value_set_from_csv()
 
-    def _load_value_set_from_csv(self):
+    @staticmethod
+    def _parse_dependent_columns(params: Dict[str, Any]) -> Tuple[List[str], List[str]]:
         """
-        Load the value set from the specified column in the CSV file.
+        Collect the dependent_column_N and dependent_concept_id_N pairs ordered by N.
 
         Args:
-            link (str): The path to the CSV file.
-            column (str): The column name in the CSV file to use for the value set.
+            params (dict): The generator parameters.
+
+        Returns:
+            Tuple[List[str], List[str]]: The dependent column names and the concept IDs they fill.
+
+        Raises:
+            ValueError: If a dependent column has no concept ID or the other way round.
+        """
+        numbers = {}
+        for key in params:
+            match = re.fullmatch(r'dependent_(column|concept_id)_(\d+)', key)
+            if match:
+                numbers.setdefault(int(match.group(2)), set()).add(match.group(1))
+
+        columns, concept_ids = [], []
+        for number in sorted(numbers):
+            if numbers[number] != {'column', 'concept_id'}:
+                raise ValueError(f"dependent_column_{number} and dependent_concept_id_{number} must be given together")
+            columns.append(params[f'dependent_column_{number}'])
+            concept_ids.append(params[f'dependent_concept_id_{number}'])
+        return columns, concept_ids
+
+    def _load_value_set_from_csv(self):
+        """
+        Load the main and dependent columns from the CSV file and build the row sampler.
+
+        The file is read through the process-wide value set cache, so concepts sharing a CSV file parse it once.
 
         Raises:
-            ValueError: If the column is not specified or not found in the file.
+            ValueError: If the column is not specified, the file does not exist, a column is not found in the file
+                        or the weights are not valid numbers.
         """
         if not self.column:
             raise ValueError("Column not specified in parameters")
 
-        if not os.path.isfile(self.link):
-            raise ValueError(f"File '{self.link}' does not exist.")
-
-        df = pd.read_csv(self.link, delimiter=";", dtype=str, header=0)
-        if self.column not in df.columns:
-            raise ValueError(f"Column '{self.column}' not found in file")
+        value_set = value_set_cache.get(self.link)
+        self.value_set = [value_set.column(column) for column in [self.column] + self.dependent_columns]
+        self.vocabularies = [value_set.vocabulary(column) for column in [self.column] + self.dependent_columns]
 
-        if self.dependent_columns:
-            self.value_set = df[[self.column] + [self.dependent_columns]]
-        else:
-            self.value_set = df[self.column]
+        weights = None
+        if self.weight:
+            try:
+                weights = pd.to_numeric(value_set.column(self.weight))
+            except ValueError as e:
+                raise ValueError(f"Invalid weight in column '{self.weight}': {str(e)}")
+        self.sampler = IndexSampler(len(value_set), weights)
 
-    def generate(self, count: int) -> List[str]:
+    def generate(self, count: int, rng: Optional[np.random.Generator] = None) -> Union[np.ndarray, tuple]:
         """
         Generate random values from the loaded value set.
 
         Args:
             count (int): The number of values to generate.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
 
         Returns:
-            List[str]: A list of randomly generated values from the value set.
+            Union[np.ndarray, tuple]: The values of the main column, or if there are dependent columns a tuple with
+                                      one array per column, all taken from the same sampled rows.
         """
-        return self.value_set.sample(n=count, replace=True).values.tolist()
+        rows = self.sample_indices(count, rng)
+        if not self.dependent_columns:
+            return self.value_set[0][rows]
+        return tuple(values[rows] for values in self.value_set)
 
+    def sample_indices(self, count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        return self.sampler.sample(count, self._resolve_rng(rng))
 
-class StringGenerator(AbstractGenerator):
+
+class StringGenerator(VocabularyGenerator):
     """
     Generator for random string values based on a value set or regex pattern.
     """
@@ -233,30 +392,44 @@ class StringGenerator(AbstractGenerator):
         """
         self.value_set = value_set
         self.regex = regex
+        # Sorted so that the same random draws pick the same values in every run
+        self.value_array = np.array(sorted(value_set), dtype=str) if value_set else None
+        self.value_sampler = IndexSampler(len(self.value_array)) if value_set else None
+        if value_set:
+            self.vocabularies = [np.unique(self.value_array, return_inverse=True)]
+        self.regex_sampler: Optional[RegexSampler] = compile_regex(regex) if regex else None
 
-    def generate(self, count: int) -> List[str]:
+    def generate(self, count: int, rng: Optional[np.random.Generator] = None) -> Union[np.ndarray, List[str]]:
         """
         Generate random string values based on the value set or regex pattern.
 
         Args:
             count (int): The number of string values to generate.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
 
         Returns:
-            List[str]: A list of randomly generated string values.
+            Union[np.ndarray, List[str]]: The randomly generated string values.
         """
         if self.value_set:  # If value set is provided, choose from it
-            return [random.choice(tuple(self.value_set)) for _ in range(count)]
-        elif self.regex:  # If regex pattern is provided, generate strings based on it
-            return [exrex.getone(self.regex) for _ in range(count)]
+            return self.value_array[self.sample_indices(count, rng)]
+        elif self.regex_sampler:  # If regex pattern is provided, sample the precompiled pattern for the whole batch
+            return self.regex_sampler.sample(count, self._resolve_rng(rng))
         else:  # Default to empty strings
             return ['' for _ in range(count)]
 
+    def sample_indices(self, count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        return self.value_sampler.sample(count, self._resolve_rng(rng))
+
 
 class UUIDGenerator(AbstractGenerator):
     """
     Generator for random UUID values.
     """
 
+    _HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+    # Positions of the hex digits within the canonical 8-4-4-4-12 representation
+    _HEX_POSITIONS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
     def __init__(self, **kwargs: Dict[str, Any]) -> None:
         """
         Initialize the UUIDGenerator with optional parameters.
@@ -266,17 +439,32 @@ class UUIDGenerator(AbstractGenerator):
         """
         pass
 
-    def generate(self, count: int) -> List[uuid.UUID]:
+    def generate(self, count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
         """
-        Generate random UUID values.
+        Generate random version 4 UUID values in their canonical string representation.
+
+        All random bytes are drawn at once, the version and variant bits are set for all rows in one step and the
+        hex representation is assembled as a byte matrix, so no Python object is created per row.
 
         Args:
             count (int): The number of UUID values to generate.
+            rng (np.random.Generator, optional): The random generator to draw from. Defaults to a fresh generator.
 
         Returns:
-            List[uuid.UUID]: A list of randomly generated UUID values.
+            np.ndarray: A fixed-width string array of randomly generated UUIDs.
         """
-        return [uuid.uuid4() for _ in range(count)]
+        # Copied because arrays created by frombuffer are read-only
+        random_bytes = np.frombuffer(self._resolve_rng(rng).bytes(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+        random_bytes[:, 6] = (random_bytes[:, 6] & 0x0F) | 0x40  # Version 4
+        random_bytes[:, 8] = (random_bytes[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+        digits = np.empty((count, 32), dtype=np.uint8)
+        digits[:, 0::2] = self._HEX_DIGITS[random_bytes >> 4]
+        digits[:, 1::2] = self._HEX_DIGITS[random_bytes & 0x0F]
+
+        canonical = np.full((count, 36), ord('-'), dtype=np.uint8)
+        canonical[:, self._HEX_POSITIONS] = digits
+        return canonical.view('S36').ravel().astype('U36')
 
 
 class GeneratorFactory:
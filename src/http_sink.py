@@ -0,0 +1,171 @@
+import asyncio
+import csv
+import logging
+import threading
+from typing import Optional
+
+import aiohttp
+
+from csv_to_cda import Document, serialize_document
+from output_sinks import OutputSink
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+# Delay in seconds before the first retry, doubled for every further one
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 30.0
+# Statuses that are worth retrying, as the server may accept the document later
+_RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+MANIFEST_FIELDS = ['index', 'name', 'result', 'status', 'attempts', 'error']
+
+
+class HttpSink(OutputSink):
+    """
+    Posts the CDA documents to an import endpoint while the next ones are generated.
+
+    Uploads run on an event loop in a background thread with one pooled aiohttp session. At most concurrency
+    requests are in flight, and write blocks while twice as many documents are not delivered yet, so generation
+    never runs far ahead of the endpoint. Failed requests are retried with exponential backoff. The outcome of every
+    document is appended to a CSV manifest as soon as it is known.
+
+    If more than max_failures documents could not be delivered, close raises, so that the run fails. If none of the
+    first concurrency documents reached the endpoint at all, the remaining uploads are given up and the next write
+    raises, instead of trying every document of the run against an unreachable endpoint.
+
+    The manifest lists the documents in the order their uploads complete. As posted documents cannot be taken
+    back, the sink is not resumable and cannot be combined with checkpoints.
+    """
+
+    def __init__(self, url: str, manifest_path: str, concurrency: int = DEFAULT_CONCURRENCY,
+                 retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT,
+                 max_failures: int = 0, pretty_print: bool = True) -> None:
+        """
+        Initialize the HttpSink and start its event loop.
+
+        Args:
+            url (str): The URL every document is posted to as 'application/xml'.
+            manifest_path (str): The path of the CSV manifest recording the outcome of every document.
+            concurrency (int, optional): Maximum number of requests in flight. Defaults to DEFAULT_CONCURRENCY.
+            retries (int, optional): Number of retries of a failed request. Defaults to DEFAULT_RETRIES.
+            backoff (float, optional): Delay in seconds before the first retry. Defaults to DEFAULT_BACKOFF.
+            timeout (float, optional): Timeout in seconds of a single request. Defaults to DEFAULT_TIMEOUT.
+            max_failures (int, optional): Number of documents that may fail to be delivered. Defaults to 0.
+            pretty_print (bool, optional): Flag to indicate whether to indent element trees. Defaults to True.
+
+        Raises:
+            ValueError: If concurrency is not positive or retries or max_failures is negative.
+        """
+        if concurrency < 1 or retries < 0 or max_failures < 0:
+            raise ValueError('The HTTP sink needs a positive concurrency and a non-negative number of retries and '
+                             'failures')
+        self.url = url
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.pretty_print = pretty_print
+        self.delivered = 0
+        self.failed = 0
+        # Documents of the first concurrency ones that did not reach the endpoint, see _upload
+        self._unreachable = 0
+        self._abort: Optional[RuntimeError] = None
+
+        self._manifest_file = open(manifest_path, 'w', newline='', encoding='UTF-8')
+        self._manifest = csv.writer(self._manifest_file)
+        self._manifest.writerow(MANIFEST_FIELDS)
+        self._slots = 2 * concurrency
+        self._pending = threading.BoundedSemaphore(self._slots)
+        self._errors = []
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='http-sink', daemon=True)
+        self._thread.start()
+        self._session = asyncio.run_coroutine_threadsafe(self._open_session(), self._loop).result()
+
+    def write(self, index: int, document: Document) -> None:
+        if self._abort is not None:
+            raise self._abort
+        data = serialize_document(document, self.pretty_print)
+        self._pending.acquire()
+        asyncio.run_coroutine_threadsafe(self._upload(index, data), self._loop)
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        try:
+            # Every upload releases its slot when it is done
+            for _ in range(self._slots):
+                self._pending.acquire()
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._manifest_file.close()
+        if self._errors:
+            raise self._errors[0]
+        logging.info(f"Delivered {self.delivered} CDA documents to {self.url}, {self.failed} failed.")
+        if self.failed:
+            logging.warning(f"See the manifest {self._manifest_file.name} for the failed CDA documents.")
+        if self._abort is not None:
+            raise self._abort
+        if self.failed > self.max_failures:
+            raise RuntimeError(f'{self.failed} CDA documents could not be delivered to {self.url}, '
+                               f'at most {self.max_failures} may fail')
+
+    async def _open_session(self) -> aiohttp.ClientSession:
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                     headers={'Content-Type': 'application/xml'})
+
+    async def _upload(self, index: int, data: bytes) -> None:
+        try:
+            async with self._semaphore:
+                status, attempts, error = await self._post(data)
+            delivered = error is None
+            if delivered:
+                self.delivered += 1
+            else:
+                self.failed += 1
+            # Without any response to the first requests, the endpoint is assumed to be unreachable
+            if self.delivered + self.failed <= self.concurrency and status is None:
+                self._unreachable += 1
+                if self._unreachable == self.concurrency:
+                    self._abort = RuntimeError(f'None of the first {self.concurrency} CDA documents reached '
+                                               f'{self.url}, last error: {error}')
+            self._manifest.writerow([index, f'cda_{index}.xml', 'delivered' if delivered else 'failed',
+                                     status or '', attempts, error or ''])
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            self._pending.release()
+
+    async def _post(self, data: bytes) -> tuple:
+        """
+        Post a document, retrying on connection errors, timeouts and temporary server errors.
+
+        Returns:
+            tuple: The last HTTP status or None, the number of attempts and the error or None on success.
+        """
+        status: Optional[int] = None
+        error: Optional[str] = None
+        for attempt in range(1, self.retries + 2):
+            if attempt > 1:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 2))
+            if self._abort is not None:
+                return status, attempt - 1, error or 'Given up, the endpoint is unreachable'
+            try:
+                async with self._session.post(self.url, data=data) as response:
+                    status = response.status
+                    await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, error = None, f'{type(e).__name__}: {e}' if str(e) else type(e).__name__
+                continue
+            if status < 300:
+                return status, attempt, None
+            error = f'HTTP {status}'
+            if status not in _RETRY_STATUSES:
+                return status, attempt, error
+        return status, self.retries + 1, error
@@ -0,0 +1,86 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class IndexSampler:
+    """
+    Sampler for row indices of a value set, optionally weighted by frequency.
+
+    Weighted sampling uses Vose's alias method: the table is built once in O(n) and every draw costs one
+    uniform index and one uniform float, so a batch of draws is a single vectorized operation.
+    """
+
+    def __init__(self, size: int, weights: Optional[Sequence[float]] = None) -> None:
+        """
+        Initialize the IndexSampler and build the alias table for weighted sampling.
+
+        Args:
+            size (int): The number of rows in the value set.
+            weights (Sequence[float], optional): A non-negative weight per row. Defaults to uniform sampling.
+
+        Raises:
+            ValueError: If the value set is empty or the weights are invalid.
+        """
+        if size < 1:
+            raise ValueError("Cannot sample from an empty value set")
+        self.size = size
+        self.probability: Optional[np.ndarray] = None
+        self.alias: Optional[np.ndarray] = None
+
+        if weights is None:
+            return
+
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (size,):
+            raise ValueError(f"Expected {size} weights, got {weights.size}")
+        if not np.all(np.isfinite(weights)) or np.any(weights < 0) or weights.sum() <= 0:
+            raise ValueError("Weights must be finite, non-negative and not all zero")
+        if np.all(weights == weights[0]):
+            return
+        self.probability, self.alias = self._build_alias_table(weights)
+
+    @staticmethod
+    def _build_alias_table(weights: np.ndarray) -> tuple:
+        """
+        Build the probability and alias arrays of Vose's alias method.
+
+        Args:
+            weights (np.ndarray): The non-negative weights.
+
+        Returns:
+            tuple: The probability (float64) and alias (int64) arrays.
+        """
+        size = len(weights)
+        scaled = weights * (size / weights.sum())
+        probability = np.ones(size, dtype=np.float64)
+        alias = np.arange(size, dtype=np.int64)
+
+        small = list(np.flatnonzero(scaled < 1.0))
+        large = list(np.flatnonzero(scaled >= 1.0))
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Leftovers are 1.0 up to rounding errors
+        for i in small + large:
+            probability[i] = 1.0
+        return probability, alias
+
+    def sample(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Sample row indices.
+
+        Args:
+            count (int): The number of indices to sample.
+            rng (np.random.Generator): The random generator to draw from.
+
+        Returns:
+            np.ndarray: An int64 array of sampled row indices.
+        """
+        indices = rng.integers(0, self.size, size=count, dtype=np.int64)
+        if self.alias is None:
+            return indices
+        return np.where(rng.random(count) < self.probability[indices], indices, self.alias[indices])
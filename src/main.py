@@ -1,11 +1,21 @@
-import glob
 import logging
 import os
+from typing import Iterator, Optional
 
-from calculate_dependencies import calculate_dependencies
-from csv_to_cda import csv_to_cda
-from generate_csv import generate_csv
-from config import config
+import numpy as np
+
+from background_writer import BackgroundWriter
+from calculate_dependencies import apply_dependencies
+from checkpoints import CHECKPOINT, CheckpointingSink, file_digest, load_checkpoint
+from cda_validation import VALIDATION_REPORT, ValidatingSink
+from dependency_rules import DEFAULT_RULES_PATH, RuleSet
+from csv_to_cda import table_to_dict, transform_rows
+from generate_csv import generate_tables
+from output_sinks import STDOUT, create_sink
+from stage_timings import StageTimings
+from table_format import table_to_text
+from config import Config
+from value_set_cache import value_set_cache
 
 
 def setup_logging() -> None:
@@ -17,20 +27,6 @@ def setup_logging() -> None:
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def resolve_path(base_path: str, relative_path: str) -> str:
-    """
-    Resolve relative path to absolute path.
-
-    Args:
-        base_path (str): Base directory path.
-        relative_path (str): Relative path to resolve.
-
-    Returns:
-        str: Absolute path.
-    """
-    return os.path.abspath(os.path.join(base_path, relative_path))
-
-
 def clean_up(csv_path: str) -> None:
     """
     Clean up intermediate files including the specified CSV file
@@ -44,35 +40,126 @@ def clean_up(csv_path: str) -> None:
 
 
 
-def process_excel_to_cda(number: int, cleanup: bool, output_dir: str) -> None:
+def prepare_rows(
+        tables: Iterator,
+        rules: RuleSet,
+        csv_path: Optional[str] = None
+) -> Iterator[dict]:
+    """
+    Apply the dependency rules to generated tables and convert them to rows for the CDA transformation.
+
+    Args:
+        tables (Iterator): The generated chunks as yielded by generate_tables.
+        rules (RuleSet): The dependency rules to apply.
+        csv_path (str, optional): Path of a CSV file to also write the rows to.
+
+    Yields:
+        dict: Every row as a dictionary of field names and values.
+    """
+    for start, table in tables:
+        apply_dependencies(table, rules)
+
+        if csv_path:
+            table_to_text(table).to_csv(csv_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+        yield from table_to_dict(table)
+
+
+def process_excel_to_cda(options: Config) -> None:
     """
     Process Excel file to CDA format.
 
-    This function orchestrates the conversion of an Excel file to CDA format by generating a CSV file,
-    calculating dependencies, and transforming the CSV to CDA. Optionally, it cleans up intermediate files.
+    This function orchestrates the conversion of an Excel file to CDA format by generating the rows, calculating
+    dependencies and transforming the rows to CDA. The stages hand each chunk of rows over in memory. Optionally,
+    the rows are also written to an intermediate CSV file, which cleanup removes again. A run with checkpoints can
+    be resumed after an interruption, with the same result as an uninterrupted run.
 
     Args:
-        number (int): Number of rows to process from the Excel file.
-        cleanup (bool): Flag to indicate whether to clean up intermediate files.
-        output_dir (str, optional): Directory to store output files. Defaults to '../output/'.
+        options (Config): The options of the run, as parsed from the command line.
     """
-    # Create output directory if it does not exist
-    if not os.path.exists(output_dir):
+    output_dir = options.output
+    rules_path = options.rules or DEFAULT_RULES_PATH
+    if output_dir == STDOUT:
+        if options.write_csv:
+            raise ValueError('--write-csv needs an output directory, not stdout')
+        if (options.xsd or options.schematron) and not options.validation_report:
+            raise ValueError('Validating documents written to stdout needs a path for the validation report')
+    elif not os.path.exists(output_dir):
+        # Create output directory if it does not exist
         os.makedirs(output_dir)
 
-    csv_path = os.path.join(output_dir, "data.csv")
+    csv_path = os.path.join(output_dir, "data.csv") if options.write_csv else None
 
     try:
-        logging.info("Generating CSV...")
-        generate_csv(config.xlsx, csv_path, number)
-
-        logging.info("Calculating dependencies...")
-        calculate_dependencies(csv_path)
-
-        logging.info("Transforming to CDA...")
-        csv_to_cda(csv_path, config.xslt, config.output)
-
-        if cleanup:
+        seed = options.seed
+        run, checkpoint, start = None, None, 0
+        if options.checkpoint_every or options.resume:
+            if options.write_csv:
+                raise ValueError('--write-csv cannot be combined with checkpoints')
+            if options.sink != 'directory':
+                raise ValueError(f'Only the directory sink can be resumed, not the {options.sink} sink')
+            if seed is None and not options.resume:
+                seed = int(np.random.SeedSequence().entropy)
+                logging.info(f"Using random seed {seed}")
+            # Everything the documents depend on; chunk size, workers and renderer do not change them
+            run = {
+                'number': options.number, 'seed': seed, 'xlsx': file_digest(options.xlsx),
+                'xslt': file_digest(options.xslt), 'rules': file_digest(rules_path),
+                'pretty_print': options.pretty_print, 'sink': options.sink, 'layout': options.layout,
+                'fanout': options.fanout, 'manifest': options.manifest,
+                'xsd': options.xsd and file_digest(options.xsd),
+                'schematron': options.schematron and file_digest(options.schematron),
+                'validate_every': options.validate_every, 'validate_rate': options.validate_rate,
+            }
+            if options.resume:
+                checkpoint = load_checkpoint(os.path.join(output_dir, CHECKPOINT), run)
+                seed = run['seed'] = checkpoint['run']['seed']
+                start = checkpoint['documents']
+                if checkpoint['complete']:
+                    logging.info("The run to resume is already complete.")
+                    return
+                logging.info(f"Resuming after {start} CDA documents...")
+
+        rules = RuleSet.from_file(rules_path)
+        max_bytes = options.max_part_size * 1024 * 1024 if options.max_part_size else None
+        output_sink = create_sink(options.sink, output_dir, compression=options.compression, max_bytes=max_bytes,
+                                  pretty_print=options.pretty_print, url=options.http_url,
+                                  concurrency=options.http_concurrency, retries=options.http_retries,
+                                  max_failures=options.http_max_failures, layout=options.layout,
+                                  fanout=options.fanout, manifest=options.manifest)
+        timings = StageTimings()
+        # Closed here until the background writer takes it over, e.g. to stop the threads of the HTTP sink
+        try:
+            if options.xsd or options.schematron:
+                report_path = options.validation_report or os.path.join(output_dir, VALIDATION_REPORT)
+                output_sink = ValidatingSink(output_sink, report_path, xsd_path=options.xsd,
+                                             schematron_path=options.schematron, every=options.validate_every,
+                                             rate=options.validate_rate, workers=options.validation_workers,
+                                             pretty_print=options.pretty_print, timings=timings)
+            if run is not None:
+                if checkpoint is not None:
+                    output_sink.restore(checkpoint['sink'])
+                output_sink = CheckpointingSink(output_sink, os.path.join(output_dir, CHECKPOINT), run,
+                                                total=options.number, chunk_size=options.chunk_size,
+                                                chunks=options.checkpoint_every or 1, documents=start)
+            writer = BackgroundWriter(output_sink, options.writer_queue, fsync_every=options.fsync_every,
+                                      timings=timings)
+        except BaseException:
+            output_sink.close()
+            raise
+
+        logging.info("Generating rows and transforming to CDA...")
+        # Generators, so that their errors are raised within the writer block, which closes the sink
+        tables = generate_tables(options.xlsx, options.number, seed, options.chunk_size, options.workers, start)
+        rows = prepare_rows(tables, rules, csv_path)
+        documents = transform_rows(rows, options.xslt, options.transform_workers, pretty_print=options.pretty_print,
+                                   renderer=options.renderer)
+        with writer:
+            for i, document in enumerate(timings.iterate('generating and transforming', documents), start=start + 1):
+                writer.write(i, document)
+        timings.log()
+
+        if options.cleanup and csv_path:
             clean_up(csv_path)
 
         logging.info("Processing completed successfully.")
@@ -87,9 +174,11 @@ def main() -> None:
 
     This function sets up logging and initiates the processing of the Excel file to CDA format.
     """
+    # Create config at program start
+    config = Config.from_args()
     try:
-        # Create config at program start
-        process_excel_to_cda(config.number, config.cleanup, config.output)
+        value_set_cache.configure(snapshot_dir=config.cache_dir)
+        process_excel_to_cda(config)
     except Exception as e:
         logging.error(f"Script execution failed: {str(e)}")
         exit(1)
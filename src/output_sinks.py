@@ -0,0 +1,534 @@
+import csv
+import gzip
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import struct
+import sys
+import tarfile
+import zipfile
+from typing import BinaryIO, Dict, Optional, TextIO, Type
+
+from csv_to_cda import Document, create_directory, serialize_document, write_cda
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+# Output path that writes a single part to standard output instead of a directory
+STDOUT = '-'
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+_COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+# Timestamp of archive members and gzip headers, so that runs with the same seed write identical files
+_FIXED_MTIME = 0
+_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+LAYOUTS = ('flat', 'index', 'hash')
+DEFAULT_FANOUT = 256
+# Manifest of the directory sink, one row per written document
+MANIFEST = 'manifest.csv'
+MANIFEST_FIELDS = ['index', 'path', 'size', 'sha256', 'encounter_id']
+_ENCOUNTER_ID_PATTERN = re.compile(rb'<(?:\w+:)?encompassingEncounter\b.*?<(?:\w+:)?id\b([^>]*)>', re.DOTALL)
+_EXTENSION_PATTERN = re.compile(rb'\sextension="([^"]*)"')
+
+
+class OutputSink:
+    """
+    Receives the CDA documents of a run in index order and stores or forwards them.
+
+    Sinks are context managers; close must be called once all documents are written. Resumable sinks can
+    continue a run that was interrupted after a checkpoint, see checkpoint and restore.
+    """
+
+    resumable = False
+
+    def write(self, index: int, document: Document) -> None:
+        """
+        Store one CDA document.
+
+        Args:
+            index (int): The number of the document, starting at 1.
+            document (Document): The CDA document, as element tree or already serialized.
+        """
+        raise NotImplementedError
+
+    def sync(self) -> None:
+        """
+        Make the documents written so far durable on disk. Sinks that do not write files do nothing.
+        """
+
+    def checkpoint(self) -> dict:
+        """
+        Make the documents written so far durable and get the state needed to continue after them.
+
+        Returns:
+            dict: The JSON-serializable state to pass to restore.
+
+        Raises:
+            ValueError: If the sink is not resumable.
+        """
+        raise ValueError(f'{type(self).__name__} cannot be resumed')
+
+    def restore(self, state: dict) -> None:
+        """
+        Continue after a checkpoint. Must be called before the first document is written.
+
+        Args:
+            state (dict): The state returned by checkpoint.
+
+        Raises:
+            ValueError: If the sink is not resumable.
+        """
+        raise ValueError(f'{type(self).__name__} cannot be resumed')
+
+    def close(self) -> None:
+        """
+        Flush and close everything the sink has opened.
+        """
+
+    def __enter__(self) -> 'OutputSink':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class DirectorySink(OutputSink):
+    """
+    Writes every CDA document to its own file 'cda_{index}.xml' in a directory.
+
+    With the 'flat' layout all files are in the output directory. The 'index' and 'hash' layouts spread them
+    over two levels of subdirectories with fanout entries each: 'index' fills one subdirectory after the
+    other, so consecutive documents stay together, while 'hash' spreads the documents evenly by the hash of
+    their file name. Optionally, a manifest of the written documents is appended to while they are written.
+
+    The sink is resumable: documents after a checkpoint are simply written again, and the manifest is cut back
+    to the rows before it.
+    """
+
+    resumable = True
+
+    def __init__(self, output_dir: str, pretty_print: bool = True, layout: str = 'flat',
+                 fanout: int = DEFAULT_FANOUT, manifest: bool = False) -> None:
+        """
+        Initialize the DirectorySink.
+
+        Args:
+            output_dir (str): The directory to save the output files.
+            pretty_print (bool, optional): Flag to indicate whether to indent element trees. Defaults to True.
+            layout (str, optional): One of LAYOUTS. Defaults to 'flat'.
+            fanout (int, optional): Number of entries per subdirectory of the sharded layouts.
+                                    Defaults to DEFAULT_FANOUT.
+            manifest (bool, optional): Flag to indicate whether to write MANIFEST to the output directory.
+                                       Defaults to False.
+
+        Raises:
+            ValueError: If the output is stdout, the layout is unknown or fanout is less than 2.
+        """
+        if output_dir == STDOUT:
+            raise ValueError('The directory sink needs an output directory, use an archive or stream sink for stdout')
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout '{layout}', expected one of {', '.join(LAYOUTS)}")
+        if fanout < 2:
+            raise ValueError('The fanout of a sharded layout must be at least 2')
+        create_directory(output_dir)
+        self.output_dir = output_dir
+        self.pretty_print = pretty_print
+        self.layout = layout
+        self.fanout = fanout
+        self._width = len(str(fanout - 1))
+        self._directories = {''}
+        # Documents are written in index order, so the unsynced ones are a range and need no list of paths
+        self._unsynced: Optional[range] = None
+        self.manifest = manifest
+        # Opened with the first document, as restore may still ask to continue an existing manifest
+        self._manifest: Optional[TextIO] = None
+        self._manifest_bytes: Optional[int] = None
+
+    def relative_path(self, index: int) -> str:
+        """
+        Get the path of a document relative to the output directory.
+
+        Args:
+            index (int): The number of the document.
+
+        Returns:
+            str: The relative path, with '/' as separator.
+        """
+        name = f'cda_{index}.xml'
+        if self.layout == 'flat':
+            return name
+        if self.layout == 'index':
+            first, second = divmod((index - 1) // self.fanout, self.fanout)
+        else:
+            digest = int.from_bytes(hashlib.md5(name.encode('ascii')).digest()[:8], 'big')
+            second, first = divmod(digest % (self.fanout * self.fanout), self.fanout)
+        return f'{first:0{self._width}d}/{second:0{self._width}d}/{name}'
+
+    def write(self, index: int, document: Document) -> None:
+        relative_path = self.relative_path(index)
+        directory = os.path.dirname(relative_path)
+        if directory not in self._directories:
+            os.makedirs(os.path.join(self.output_dir, directory), exist_ok=True)
+            self._directories.add(directory)
+        if not self.manifest:
+            write_cda(document, os.path.join(self.output_dir, directory), index, self.pretty_print)
+        else:
+            if self._manifest is None:
+                self._open_manifest()
+            data = serialize_document(document, self.pretty_print)
+            write_cda(data, os.path.join(self.output_dir, directory), index)
+            self._manifest_writer.writerow([index, relative_path, len(data), hashlib.sha256(data).hexdigest(),
+                                            encounter_id(data)])
+        self._unsynced = range(self._unsynced.start if self._unsynced else index, index + 1)
+
+    def sync(self) -> None:
+        if self._manifest is not None:
+            self._manifest.flush()
+            os.fsync(self._manifest.fileno())
+        directories = set()
+        for relative_path in map(self.relative_path, self._unsynced or ()):
+            _fsync_path(os.path.join(self.output_dir, relative_path))
+            directory = os.path.dirname(relative_path)
+            while directory not in directories:
+                directories.add(directory)
+                directory = os.path.dirname(directory)
+        # The entries of new files and subdirectories are only durable once their directories are synced
+        for directory in directories:
+            _fsync_path(os.path.join(self.output_dir, directory))
+        self._unsynced = None
+
+    def checkpoint(self) -> dict:
+        if self.manifest and self._manifest is None:
+            self._open_manifest()
+        self.sync()
+        return {'manifest_bytes': self._manifest.tell()} if self.manifest else {}
+
+    def restore(self, state: dict) -> None:
+        if self._manifest is not None:
+            raise ValueError('The directory sink can only be restored before the first document is written')
+        if self.manifest:
+            if 'manifest_bytes' not in state:
+                raise ValueError('The checkpoint was written without a manifest')
+            self._manifest_bytes = state['manifest_bytes']
+
+    def close(self) -> None:
+        if self.manifest and self._manifest is None:
+            self._open_manifest()
+        if self._manifest is not None:
+            self._manifest.close()
+
+    def _open_manifest(self) -> None:
+        path = os.path.join(self.output_dir, MANIFEST)
+        if self._manifest_bytes is None:
+            self._manifest = open(path, 'w', newline='', encoding='UTF-8')
+            self._manifest_writer = csv.writer(self._manifest)
+            self._manifest_writer.writerow(MANIFEST_FIELDS)
+        else:
+            # Rows after the checkpoint are written again
+            self._manifest = open(path, 'r+', newline='', encoding='UTF-8')
+            self._manifest.truncate(self._manifest_bytes)
+            self._manifest.seek(self._manifest_bytes)
+            self._manifest_writer = csv.writer(self._manifest)
+
+
+def encounter_id(document: bytes) -> str:
+    """
+    Get the ID of the encounter a serialized CDA document is about, without parsing the document.
+
+    Args:
+        document (bytes): The serialized CDA document.
+
+    Returns:
+        str: The extension of the first id of the encompassingEncounter, or '' if there is none.
+    """
+    match = _ENCOUNTER_ID_PATTERN.search(document)
+    if not match:
+        return ''
+    extension = _EXTENSION_PATTERN.search(match.group(1))
+    return html.unescape(extension.group(1).decode('utf-8')) if extension else ''
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _CountingWriter:
+    """
+    A write-only file object counting the bytes passed on to another file object.
+
+    It has no seek, so archive writers treat it as a stream and never go back to rewrite headers.
+    """
+
+    def __init__(self, target: BinaryIO) -> None:
+        self.target = target
+        self.count = 0
+
+    def write(self, data) -> int:
+        self.target.write(data)
+        self.count += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.count
+
+    def flush(self) -> None:
+        self.target.flush()
+
+
+class _PartSink(OutputSink):
+    """
+    Base class of sinks writing the documents into a sequence of files, 'cda_part_{n:05d}{extension}'.
+
+    A new part is started once the current one has reached max_bytes, so a part exceeds the limit by at most
+    one document and what the compressor still buffers. Written to stdout, there is a single part. Nothing is
+    written to temporary files: every part is a stream that is only appended to.
+    """
+
+    extension = ''
+
+    def __init__(self, output: str, compression: str = 'none', max_bytes: Optional[int] = None,
+                 pretty_print: bool = True) -> None:
+        """
+        Initialize the sink. The first part is opened with the first document.
+
+        Args:
+            output (str): The directory to write the parts to, or STDOUT.
+            compression (str, optional): One of COMPRESSIONS. Defaults to 'none'.
+            max_bytes (int, optional): Size in bytes at which a new part is started. Defaults to no limit.
+            pretty_print (bool, optional): Flag to indicate whether to indent element trees. Defaults to True.
+
+        Raises:
+            ValueError: If the compression is unknown or unavailable, or a size limit is set for stdout.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression needs the 'zstandard' package")
+        if output == STDOUT and max_bytes:
+            raise ValueError('Parts cannot be rolled over when writing to stdout')
+        if output != STDOUT:
+            create_directory(output)
+        self.output = output
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.pretty_print = pretty_print
+        self.parts = 0
+        self._file: Optional[BinaryIO] = None
+        self._counter: Optional[_CountingWriter] = None
+        self._stream: Optional[BinaryIO] = None
+
+    def part_path(self, part: int) -> str:
+        """
+        Get the path of a part.
+
+        Args:
+            part (int): The number of the part, starting at 1.
+
+        Returns:
+            str: The path of the part file in the output directory.
+        """
+        suffix = self.extension + self._compression_suffix()
+        return os.path.join(self.output, f'cda_part_{part:05d}{suffix}')
+
+    def write(self, index: int, document: Document) -> None:
+        if self._stream is None:
+            self._open_part()
+        self._add(index, serialize_document(document, self.pretty_print))
+        if self.max_bytes and self._counter.count >= self.max_bytes:
+            self._close_part()
+
+    def sync(self) -> None:
+        # Only what the compressor has passed on; flushing it would change the compressed bytes
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._close_part()
+
+    def _compression_suffix(self) -> str:
+        return _COMPRESSION_SUFFIXES[self.compression]
+
+    def _compress(self, target: BinaryIO) -> BinaryIO:
+        if self.compression == 'gzip':
+            return gzip.GzipFile(fileobj=target, mode='wb', mtime=_FIXED_MTIME)
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().stream_writer(target, closefd=False)
+        return target
+
+    def _open_part(self) -> None:
+        self.parts += 1
+        if self.output == STDOUT:
+            self._file = None
+            target = sys.stdout.buffer
+        else:
+            self._file = target = open(self.part_path(self.parts), 'wb')
+        self._counter = _CountingWriter(target)
+        self._stream = self._compress(self._counter)
+        self._start()
+
+    def _close_part(self) -> None:
+        self._finish()
+        if self._stream is not self._counter:
+            self._stream.close()
+        self._counter.flush()
+        if self._file is not None:
+            self._file.close()
+        self._stream = self._counter = self._file = None
+
+    def _start(self) -> None:
+        pass
+
+    def _add(self, index: int, data: bytes) -> None:
+        raise NotImplementedError
+
+    def _finish(self) -> None:
+        pass
+
+
+class TarSink(_PartSink):
+    """
+    Writes the documents as members 'cda_{index}.xml' of streamed tar archives.
+    """
+
+    extension = '.tar'
+
+    def _start(self) -> None:
+        self._archive = tarfile.open(fileobj=self._stream, mode='w|', format=tarfile.PAX_FORMAT)
+
+    def _add(self, index: int, data: bytes) -> None:
+        info = tarfile.TarInfo(f'cda_{index}.xml')
+        info.size = len(data)
+        info.mtime = _FIXED_MTIME
+        self._archive.addfile(info, io.BytesIO(data))
+
+    def _finish(self) -> None:
+        self._archive.close()
+
+
+class ZipSink(_PartSink):
+    """
+    Writes the documents as members 'cda_{index}.xml' of streamed zip archives.
+
+    Zip compresses every member on its own, so 'gzip' stores the members deflated and 'zstd' is not supported.
+    """
+
+    extension = '.zip'
+
+    def __init__(self, output: str, compression: str = 'none', max_bytes: Optional[int] = None,
+                 pretty_print: bool = True) -> None:
+        if compression == 'zstd':
+            raise ValueError("zip archives support 'none' and 'gzip' compression only")
+        super().__init__(output, compression, max_bytes, pretty_print)
+
+    def _compression_suffix(self) -> str:
+        return ''
+
+    def _compress(self, target: BinaryIO) -> BinaryIO:
+        return target
+
+    def _start(self) -> None:
+        method = zipfile.ZIP_DEFLATED if self.compression == 'gzip' else zipfile.ZIP_STORED
+        self._archive = zipfile.ZipFile(self._stream, mode='w', compression=method)
+
+    def _add(self, index: int, data: bytes) -> None:
+        info = zipfile.ZipInfo(f'cda_{index}.xml', date_time=_ZIP_DATE_TIME)
+        info.compress_type = self._archive.compression
+        self._archive.writestr(info, data)
+
+    def _finish(self) -> None:
+        self._archive.close()
+
+
+class NdjsonSink(_PartSink):
+    """
+    Writes one JSON object per line and document: {"index": ..., "name": "cda_{index}.xml", "document": ...}.
+    """
+
+    extension = '.ndjson'
+
+    def _add(self, index: int, data: bytes) -> None:
+        record = {'index': index, 'name': f'cda_{index}.xml', 'document': data.decode('utf-8')}
+        self._stream.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class LengthPrefixedSink(_PartSink):
+    """
+    Writes the documents back to back, each preceded by its size in bytes as 4-byte unsigned big-endian integer.
+    """
+
+    extension = '.bin'
+
+    def _add(self, index: int, data: bytes) -> None:
+        self._stream.write(struct.pack('>I', len(data)))
+        self._stream.write(data)
+
+
+SINKS: Dict[str, Type[OutputSink]] = {
+    'directory': DirectorySink,
+    'tar': TarSink,
+    'zip': ZipSink,
+    'ndjson': NdjsonSink,
+    'length-prefixed': LengthPrefixedSink,
+}
+# All sinks, including the HTTP sink of http_sink, which is only imported when used
+SINK_KINDS = (*SINKS, 'http')
+# File in the output directory recording the outcome of every document posted by the HTTP sink
+HTTP_MANIFEST = 'http_manifest.csv'
+
+
+def create_sink(kind: str, output: str, compression: str = 'none', max_bytes: Optional[int] = None,
+                pretty_print: bool = True, url: Optional[str] = None, concurrency: int = 8,
+                retries: int = 3, max_failures: int = 0, layout: str = 'flat', fanout: int = DEFAULT_FANOUT,
+                manifest: bool = False) -> OutputSink:
+    """
+    Create the output sink for a run.
+
+    Args:
+        kind (str): One of SINK_KINDS.
+        output (str): The output directory, or STDOUT for the archive and stream sinks.
+        compression (str, optional): One of COMPRESSIONS, only used by archive and stream sinks. Defaults to 'none'.
+        max_bytes (int, optional): Size in bytes at which archive and stream sinks start a new part.
+        pretty_print (bool, optional): Flag to indicate whether to indent element trees. Defaults to True.
+        url (str, optional): The import URL the HTTP sink posts the documents to.
+        concurrency (int, optional): Maximum number of requests of the HTTP sink in flight. Defaults to 8.
+        retries (int, optional): Number of retries of a failed request of the HTTP sink. Defaults to 3.
+        max_failures (int, optional): Number of documents the HTTP sink may fail to deliver. Defaults to 0.
+        layout (str, optional): One of LAYOUTS, for the directory sink. Defaults to 'flat'.
+        fanout (int, optional): Number of entries per subdirectory of the sharded layouts.
+        manifest (bool, optional): Flag to indicate whether the directory sink writes MANIFEST.
+
+    Returns:
+        OutputSink: The sink.
+
+    Raises:
+        ValueError: If the sink is unknown or its options are invalid.
+    """
+    if kind not in SINK_KINDS:
+        raise ValueError(f"Unknown sink '{kind}', expected one of {', '.join(SINK_KINDS)}")
+    if kind in ('directory', 'http') and (compression != 'none' or max_bytes):
+        raise ValueError(f'The {kind} sink supports neither compression nor a size limit')
+    if kind != 'directory' and (layout != 'flat' or manifest):
+        raise ValueError('Only the directory sink supports sharded layouts and a manifest')
+    if kind == 'directory':
+        return DirectorySink(output, pretty_print, layout, fanout, manifest)
+    if kind == 'http':
+        if not url:
+            raise ValueError('The HTTP sink needs an import URL')
+        if output == STDOUT:
+            raise ValueError('The HTTP sink needs an output directory for its manifest')
+        # Imported here, as the HTTP sink builds on this module
+        from http_sink import HttpSink
+        create_directory(output)
+        return HttpSink(url, os.path.join(output, HTTP_MANIFEST), concurrency, retries, max_failures=max_failures,
+                        pretty_print=pretty_print)
+    return SINKS[kind](output, compression, max_bytes, pretty_print)
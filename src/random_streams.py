@@ -0,0 +1,116 @@
+import hashlib
+from typing import Callable, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+# Rows are generated in blocks of this size, each block of each stream from its own generator
+BLOCK_SIZE = 4096
+
+
+Values = Union[np.ndarray, Tuple[np.ndarray, ...]]
+
+
+def _slice(values: Values, start: int, stop: int) -> Values:
+    if isinstance(values, tuple):
+        return tuple(column[start:stop] for column in values)
+    return values[start:stop]
+
+
+def _concatenate(parts: list) -> Values:
+    if len(parts) == 1:
+        return parts[0]
+    if isinstance(parts[0], tuple):
+        return tuple(np.concatenate(columns) for columns in zip(*parts))
+    return np.concatenate(parts)
+
+
+def _stable_hash(key: str) -> int:
+    """
+    Hash a stream key to an integer that is the same in every process and Python version.
+
+    Args:
+        key (str): The stream key.
+
+    Returns:
+        int: A 128-bit integer derived from the key.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest(), 'little')
+
+
+class RandomStreams:
+    """
+    Independent, reproducible random streams derived from a single seed.
+
+    Every stream key (e.g. a concept ID) is divided into blocks of block_size rows and every block draws from
+    its own numpy generator, seeded from (seed, key, block index) via numpy's SeedSequence. The values of a row
+    therefore only depend on the seed, the key and the row number, not on which process generates the row
+    or how the rows are split into chunks.
+    """
+
+    def __init__(self, seed: Optional[int] = None, block_size: int = BLOCK_SIZE) -> None:
+        """
+        Initialize the RandomStreams.
+
+        Args:
+            seed (int, optional): The root seed. Defaults to fresh entropy from the operating system.
+            block_size (int, optional): The number of rows drawn from each block generator.
+        """
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.block_size = block_size
+        # Last sampled block per key, so ranges that are not aligned to blocks do not sample a block twice
+        self._last_blocks: Dict[str, Tuple[int, Values]] = {}
+
+    def generator(self, key: str, block: int) -> np.random.Generator:
+        """
+        Get the random generator of one block of a stream.
+
+        Args:
+            key (str): The stream key.
+            block (int): The block index.
+
+        Returns:
+            np.random.Generator: A freshly seeded generator, identical for identical arguments.
+        """
+        sequence = np.random.SeedSequence(self.seed, spawn_key=(_stable_hash(key), block))
+        return np.random.Generator(np.random.PCG64(sequence))
+
+    def blocks(self, start: int, stop: int) -> Iterator[Tuple[int, int, int]]:
+        """
+        Split a row range into the blocks it overlaps.
+
+        Args:
+            start (int): The first row (inclusive).
+            stop (int): The last row (exclusive).
+
+        Yields:
+            Tuple[int, int, int]: The block index and the start and stop offsets of the range within that block.
+        """
+        for block in range(start // self.block_size, -(-stop // self.block_size)):
+            offset = block * self.block_size
+            yield block, max(start, offset) - offset, min(stop, offset + self.block_size) - offset
+
+    def draw(self, key: str, sample: Callable[[int, np.random.Generator], Values], start: int, stop: int) -> Values:
+        """
+        Draw the values of a row range of a stream.
+
+        Every overlapped block is sampled in full so that a row's value does not depend on the requested range.
+
+        Args:
+            key (str): The stream key.
+            sample (Callable): A function that draws a given number of values from a generator, either as one
+                               array or as a tuple of arrays with one entry per row each.
+            start (int): The first row (inclusive).
+            stop (int): The last row (exclusive).
+
+        Returns:
+            Values: The values of rows start to stop, in the same shape sample returns them.
+        """
+        parts = []
+        for block, lo, hi in self.blocks(start, stop):
+            cached_block, values = self._last_blocks.get(key, (None, None))
+            if cached_block != block:
+                values = sample(self.block_size, self.generator(key, block))
+                values = tuple(map(np.asarray, values)) if isinstance(values, tuple) else np.asarray(values)
+                self._last_blocks[key] = (block, values)
+            parts.append(_slice(values, lo, hi))
+        return _concatenate(parts)
@@ -0,0 +1,254 @@
+from functools import lru_cache, reduce
+from typing import Dict, List, Optional
+
+import exrex
+import numpy as np
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    from re import sre_parse
+
+# Patterns whose language has at most this many strings are enumerated once and sampled by index
+ENUMERATION_LIMIT = 10_000
+# Same range limit exrex.getone applies to unbounded repeats like '*' and '+'
+REPEAT_LIMIT = 20
+
+
+def _empty(count: int) -> np.ndarray:
+    return np.full(count, '', dtype='U1')
+
+
+def _concat(parts: List[np.ndarray], count: int) -> np.ndarray:
+    return reduce(np.char.add, parts) if parts else _empty(count)
+
+
+class _Node:
+    """
+    A compiled regex node that samples a whole batch of strings at once.
+
+    Nodes mirror the semantics of exrex._randone, so every sampled string belongs to the same language as
+    exrex.getone would produce for the pattern.
+    """
+
+    def sample(self, count: int, rng: np.random.Generator, groups: Dict[int, np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class _Chars(_Node):
+    """
+    A fixed-width run of single characters, each drawn from its own set of code points.
+    """
+
+    def __init__(self, positions: List[np.ndarray]) -> None:
+        self.positions = positions
+
+    def sample(self, count: int, rng: np.random.Generator, groups: Dict[int, np.ndarray]) -> np.ndarray:
+        width = len(self.positions)
+        if width == 0:
+            return _empty(count)
+        codes = np.empty((count, width), dtype=np.uint32)
+        for j, choices in enumerate(self.positions):
+            codes[:, j] = choices[0] if len(choices) == 1 else choices[rng.integers(0, len(choices), size=count)]
+        return codes.view(f'U{width}').ravel()
+
+
+class _Sequence(_Node):
+    def __init__(self, nodes: List[_Node]) -> None:
+        self.nodes = nodes
+
+    def sample(self, count: int, rng: np.random.Generator, groups: Dict[int, np.ndarray]) -> np.ndarray:
+        return _concat([node.sample(count, rng, groups) for node in self.nodes], count)
+
+
+class _Repeat(_Node):
+    def __init__(self, node: _Node, min_count: int, max_count: int) -> None:
+        self.node = node
+        self.min_count = min_count
+        self.max_count = max_count
+
+    def sample(self, count: int, rng: np.random.Generator, groups: Dict[int, np.ndarray]) -> np.ndarray:
+        parts = [self.node.sample(count, rng, groups) for _ in range(self.min_count)]
+        result = _concat(parts, count)
+        if self.max_count == self.min_count:
+            return result
+
+        lengths = rng.integers(self.min_count, self.max_count, size=count, endpoint=True)
+        for repetition in range(self.min_count, self.max_count):
+            rows = np.flatnonzero(lengths > repetition)
+            if not len(rows):
+                break
+            result = result.astype(object)
+            result[rows] = result[rows] + _sample_rows(self.node, rows, count, rng, groups).astype(object)
+        return result.astype(str)
+
+
+class _Branch(_Node):
+    def __init__(self, branches: List[_Node]) -> None:
+        self.branches = branches
+
+    def sample(self, count: int, rng: np.random.Generator, groups: Dict[int, np.ndarray]) -> np.ndarray:
+        chosen = rng.integers(0, len(self.branches), size=count)
+        result = np.empty(count, dtype=object)
+        for index, branch in enumerate(self.branches):
+            rows = np.flatnonzero(chosen == index)
+            if len(rows):
+                result[rows] = _sample_rows(branch, rows, count, rng, groups)
+        return result.astype(str)
+
+
+class _Group(_Node):
+    def __init__(self, group_id: Optional[int], node: _Node) -> None:
+        self.group_id = group_id
+        self.node = node
+
+    def sample(self, count: int, rng: np.random.Generator, groups: Dict[int, np.ndarray]) -> np.ndarray:
+        result = self.node.sample(count, rng, groups)
+        if self.group_id:
+            groups[self.group_id] = result
+        return result
+
+
+class _GroupRef(_Node):
+    def __init__(self, group_id: int) -> None:
+        self.group_id = group_id
+
+    def sample(self, count: int, rng: np.random.Generator, groups: Dict[int, np.ndarray]) -> np.ndarray:
+        return groups[self.group_id]
+
+
+def _sample_rows(node: _Node, rows: np.ndarray, count: int, rng: np.random.Generator,
+                 groups: Dict[int, np.ndarray]) -> np.ndarray:
+    """
+    Sample a node for a subset of rows, keeping captured groups aligned with the full batch.
+    """
+    subset = {group_id: values[rows] for group_id, values in groups.items()}
+    captured = dict(subset)
+    result = node.sample(len(rows), rng, subset)
+    for group_id, values in subset.items():
+        if captured.get(group_id) is values:
+            continue
+        full = groups[group_id].astype(object) if group_id in groups else np.full(count, '', dtype=object)
+        full[rows] = values
+        groups[group_id] = full.astype(str)
+    return result
+
+
+def _code_points(chars: List[str]) -> np.ndarray:
+    return np.array([ord(char) for char in chars if char], dtype=np.uint32)
+
+
+def _compile(parsed: list) -> _Node:
+    """
+    Compile a parsed regex (as returned by exrex.parse) into a batch sampling node.
+    """
+    nodes: List[_Node] = []
+    for op, value in parsed:
+        if op == sre_parse.IN:
+            nodes.append(_Chars([_code_points(exrex._in(value))]))
+        elif op == sre_parse.LITERAL:
+            nodes.append(_Chars([np.array([value], dtype=np.uint32)]))
+        elif op == sre_parse.CATEGORY:
+            nodes.append(_Chars([_code_points(exrex.CATEGORIES.get(value, ['']))]))
+        elif op == sre_parse.ANY:
+            nodes.append(_Chars([_code_points(exrex.CATEGORIES['category_any'])]))
+        elif op == sre_parse.NOT_LITERAL:
+            nodes.append(_Chars([_code_points([c for c in exrex.CATEGORIES['category_any'] if c != chr(value)])]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            min_count, max_count, subpattern = value
+            if max_count + 1 - min_count >= REPEAT_LIMIT:
+                max_count = min_count + REPEAT_LIMIT - 1
+            node = _compile(list(subpattern))
+            if isinstance(node, _Chars) and min_count == max_count:
+                nodes.append(_Chars(node.positions * min_count))
+            else:
+                nodes.append(_Repeat(node, min_count, max_count))
+        elif op == sre_parse.BRANCH:
+            nodes.append(_Branch([_compile(list(branch)) for branch in value[1]]))
+        elif op == sre_parse.SUBPATTERN:
+            nodes.append(_Group(value[0], _compile(list(value[3]))))
+        elif op == sre_parse.ASSERT:
+            nodes.append(_Group(None, _compile(list(value[1]))))
+        elif op == sre_parse.GROUPREF:
+            nodes.append(_GroupRef(value))
+        elif op in (sre_parse.AT, sre_parse.ASSERT_NOT):
+            continue
+        else:
+            raise ValueError(f"Cannot sample regex construct {op!r}")
+
+    # Merge adjacent single characters into one fixed-width run
+    merged: List[_Node] = []
+    for node in nodes:
+        if isinstance(node, _Chars) and any(len(choices) == 0 for choices in node.positions):
+            node = _Chars([choices for choices in node.positions if len(choices)])
+        if isinstance(node, _Chars) and merged and isinstance(merged[-1], _Chars):
+            merged[-1] = _Chars(merged[-1].positions + node.positions)
+        else:
+            merged.append(node)
+    if not merged:
+        return _Chars([])
+    return merged[0] if len(merged) == 1 else _Sequence(merged)
+
+
+class RegexSampler:
+    """
+    Batch sampler for strings matching a regex pattern.
+
+    The pattern is parsed once. If its language is small it is enumerated once and sampled by index,
+    otherwise it is compiled into a tree of vectorized nodes.
+    """
+
+    def __init__(self, pattern: str, enumeration_limit: int = ENUMERATION_LIMIT) -> None:
+        """
+        Initialize the RegexSampler by compiling the pattern.
+
+        Args:
+            pattern (str): The regex pattern to sample from.
+            enumeration_limit (int, optional): The maximum language size that is enumerated up front.
+
+        Raises:
+            ValueError: If the pattern is invalid or contains constructs that cannot be sampled.
+        """
+        self.pattern = pattern
+        try:
+            parsed = exrex.parse(pattern)
+        except Exception as e:
+            raise ValueError(f"Invalid regex pattern '{pattern}': {str(e)}")
+
+        self.language: Optional[np.ndarray] = None
+        self.root: Optional[_Node] = None
+        if exrex.count(pattern, REPEAT_LIMIT) <= enumeration_limit:
+            language = list(exrex.generate(pattern, REPEAT_LIMIT))
+            if language:
+                self.language = np.array(language, dtype=str)
+        if self.language is None:
+            self.root = _compile(parsed)
+
+    def sample(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Sample strings matching the pattern.
+
+        Args:
+            count (int): The number of strings to sample.
+            rng (np.random.Generator): The random generator to draw from.
+
+        Returns:
+            np.ndarray: A string array of sampled values.
+        """
+        if self.language is not None:
+            return self.language[rng.integers(0, len(self.language), size=count)]
+        return self.root.sample(count, rng, {}).astype(str)
+
+
+@lru_cache(maxsize=None)
+def compile_regex(pattern: str) -> RegexSampler:
+    """
+    Compile a regex pattern into a sampler, reusing the sampler for patterns that were already compiled.
+
+    Args:
+        pattern (str): The regex pattern to compile.
+
+    Returns:
+        RegexSampler: The compiled sampler.
+    """
+    return RegexSampler(pattern)
@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+
+class StageTimings:
+    """
+    Accumulates the seconds the stages of a run spend, possibly measured in several threads.
+
+    A stage measured while another one is measured in the same thread is not counted for the outer stage, e.g.
+    documents validated while they are written count as validating, not as writing.
+    """
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Per thread, the seconds spent in nested stages of every stage being measured
+        self._nested = threading.local()
+
+    def add(self, stage: str, seconds: float) -> None:
+        """
+        Add time to a stage.
+
+        Args:
+            stage (str): The name of the stage.
+            seconds (float): The time to add in seconds.
+        """
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """
+        Add the time spent in a with block to a stage, less the time of stages measured within it.
+
+        Args:
+            stage (str): The name of the stage.
+        """
+        stack = self._nested.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.add(stage, seconds - stack.pop())
+            if stack:
+                stack[-1] += seconds
+
+    def iterate(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """
+        Add the time spent producing the items of a lazy iterable to a stage.
+
+        Args:
+            stage (str): The name of the stage.
+            items (Iterable[T]): The iterable, for example a generator of documents.
+
+        Yields:
+            T: The items of the iterable.
+        """
+        items = iter(items)
+        while True:
+            with self.measure(stage):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+    def log(self) -> None:
+        """
+        Log the time of every stage in the order the stages were first measured.
+        """
+        with self._lock:
+            summary = ', '.join(f'{stage} {seconds:.2f} s' for stage, seconds in self.seconds.items())
+        logging.info(f"Stage timings: {summary}")
@@ -0,0 +1,61 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from date_formatter import DEFAULT_DATE_FORMAT, format_datetimes
+
+# Key of the table attribute mapping timestamp columns to the format they are serialized in
+DATE_FORMATS = 'date_formats'
+
+
+def date_formats(table: pd.DataFrame) -> Dict[str, str]:
+    """
+    Get the serialization formats of the timestamp columns of a table, creating the mapping if necessary.
+
+    Timestamps are kept as datetime64 values through all stages and only formatted when the table is written.
+
+    Args:
+        table (pd.DataFrame): The table.
+
+    Returns:
+        Dict[str, str]: The strftime format by column name. Changes are stored in the table.
+    """
+    return table.attrs.setdefault(DATE_FORMATS, {})
+
+
+def column_to_text(column: pd.Series, date_format: Optional[str] = None) -> np.ndarray:
+    """
+    Convert a table column of any storage type to the text it is serialized as. Missing values become ''.
+
+    Args:
+        column (pd.Series): The column to convert.
+        date_format (str, optional): The format of a timestamp column. Defaults to DEFAULT_DATE_FORMAT.
+
+    Returns:
+        np.ndarray: An object array of strings.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Convert the categories once instead of every value, the code -1 of missing values picks the trailing ''
+        categories = np.append(column.cat.categories.astype(str).to_numpy(dtype=object), '')
+        return categories[column.cat.codes.to_numpy()]
+    if pd.api.types.is_datetime64_dtype(column.dtype):
+        return format_datetimes(column.to_numpy(), date_format or DEFAULT_DATE_FORMAT).astype(object)
+    text = column.astype(str).to_numpy(dtype=object)
+    text[column.isna().to_numpy()] = ''
+    return text
+
+
+def table_to_text(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert every column of a table to the text it is serialized as, e.g. for writing it to a CSV file.
+
+    Args:
+        table (pd.DataFrame): The table to convert.
+
+    Returns:
+        pd.DataFrame: A new table with one object column of strings per column.
+    """
+    formats = date_formats(table)
+    return pd.DataFrame({column: column_to_text(table[column], formats.get(column)) for column in table.columns},
+                        copy=False)
@@ -1,27 +1,112 @@
+from typing import Dict, Iterator, Optional, Tuple, Union
+
 import numpy as np
 import pandas as pd
 
+from random_streams import RandomStreams
+
+# A column as generated, before it is assembled into a table
+Column = Union[np.ndarray, pd.api.extensions.ExtensionArray]
+
 
 class ValueRemover:
     @staticmethod
-    def process_column(column: pd.Series, probability: float) -> pd.Series:
+    def process_column(column: pd.Series, probability: float, draws: Optional[np.ndarray] = None) -> pd.Series:
         """
         Remove elements from the column with a given probability.
 
         Args:
             column (pd.Series): The series of values from which elements will be removed.
             probability (float): The probability with which an element will be removed.
+            draws (np.ndarray, optional): Uniform random numbers in [0, 1), one per element.
+                                          Defaults to fresh draws from numpy's global generator.
 
         Returns:
             pd.Series: A series with some elements replaced by an empty string based on the given probability.
         """
-        return column.mask(np.random.random(len(column)) < probability, '')
+        if draws is None:
+            draws = np.random.random(len(column))
+        return column.mask(draws < probability, '')
+
+    @staticmethod
+    def process_array(values: Column, probability: float, draws: Optional[np.ndarray] = None) -> Column:
+        """
+        Remove elements from an array with a given probability, keeping the array's storage type where possible.
+
+        Removed elements become '' in string arrays and categoricals, NaN in float arrays, NaT in datetime
+        arrays and NA in integer arrays, which turn into nullable integer arrays. All of them are serialized as
+        empty values.
+
+        Args:
+            values (Column): The array of values from which elements will be removed.
+            probability (float): The probability with which an element will be removed.
+            draws (np.ndarray, optional): Uniform random numbers in [0, 1), one per element.
+                                          Defaults to fresh draws from numpy's global generator.
+
+        Returns:
+            Column: The array with some elements removed.
+        """
+        if draws is None:
+            draws = np.random.random(len(values))
+        removed = draws < probability
+        if not removed.any():
+            return values
+        if isinstance(values, pd.Categorical):
+            values = values.copy() if '' in values.categories else values.add_categories([''])
+            values[removed] = ''
+            return values
+        values = np.asarray(values)
+        if values.dtype.kind in 'iu':
+            return pd.arrays.IntegerArray(values, removed)
+        if values.dtype.kind == 'f':
+            return np.where(removed, np.nan, values)
+        if values.dtype.kind == 'M':
+            return np.where(removed, np.datetime64('NaT'), values)
+        if values.dtype.kind == 'U':
+            return np.where(removed, '', values)
+        values = values.astype(object)
+        values[removed] = ''
+        return values
+
+    @staticmethod
+    def _removal_probabilities(var_dict: dict) -> Iterator[Tuple[str, float]]:
+        """
+        Validate the probabilities in var_dict and yield the nullable concept IDs with their probability.
+
+        Args:
+            var_dict (dict): A dictionary where keys are concept IDs and values are tuples containing
+                             information about each variable, including nullability and probability of missing values.
+
+        Yields:
+            Tuple[str, float]: The concept ID and its probability of missing values.
+
+        Raises:
+            ValueError: If the probability is non-zero for a non-nullable concept ID or if the probability is not between 0 and 1.
+        """
+        for concept_id, (_, _, nullable, prob_missing) in var_dict.items():
+            if nullable is False and prob_missing > 0:
+                raise ValueError(
+                    f"Probability of missing values is non-zero for a non-nullable conceptId: {concept_id}.")
+            if prob_missing < 0 or prob_missing > 1:
+                raise ValueError(f"Probability of missing values must be between 0 and 1 for conceptId: {concept_id}.")
+            if nullable:
+                yield concept_id, prob_missing
+
+    @staticmethod
+    def _draws(streams: Optional[RandomStreams], concept_id: str, start: int, count: int) -> Optional[np.ndarray]:
+        if streams is None:
+            return None
+        return streams.draw(f'missing:{concept_id}', lambda size, rng: rng.random(size), start, start + count)
 
     @classmethod
-    def process_df(cls, df: pd.DataFrame, var_dict: dict) -> pd.DataFrame:
+    def process_df(cls, df: pd.DataFrame, var_dict: dict, streams: Optional[RandomStreams] = None,
+                   start: int = 0) -> pd.DataFrame:
         """
         Remove values from the DataFrame based on the probabilities specified in var_dict.
 
+        If streams are given, the removal of each concept draws from its own stream 'missing:<concept id>',
+        so the removed cells only depend on the seed and the row numbers.
+
         Args:
             df (pd.DataFrame): The DataFrame containing the data.
             var_dict (dict): A dictionary where keys are concept IDs and values are tuples containing
@@ -34,6 +119,8 @@ class ValueRemover:
                                     True,
                                     0.1)
                             }.
+            streams (RandomStreams, optional): The random streams to draw from. Defaults to numpy's global generator.
+            start (int, optional): The row number of the first row of df within the whole dataset. Defaults to 0.
 
         Returns:
             pd.DataFrame: The DataFrame with values removed according to the specified probabilities.
@@ -41,12 +128,33 @@ class ValueRemover:
         Raises:
             ValueError: If the probability is non-zero for a non-nullable concept ID or if the probability is not between 0 and 1.
         """
-        for concept_id, (_, _, nullable, prob_missing) in var_dict.items():
-            if nullable is False and prob_missing > 0:
-                raise ValueError(
-                    f"Probability of missing values is non-zero for a non-nullable conceptId: {concept_id}.")
-            if prob_missing < 0 or prob_missing > 1:
-                raise ValueError(f"Probability of missing values must be between 0 and 1 for conceptId: {concept_id}.")
-            if nullable:
-                df[concept_id] = cls.process_column(df[concept_id], prob_missing)
+        for concept_id, prob_missing in cls._removal_probabilities(var_dict):
+            draws = cls._draws(streams, concept_id, start, len(df))
+            df[concept_id] = cls.process_column(df[concept_id], prob_missing, draws)
         return df
+
+    @classmethod
+    def process_columns(cls, columns: Dict[str, Column], var_dict: dict, count: int,
+                        streams: Optional[RandomStreams] = None, start: int = 0) -> Dict[str, Column]:
+        """
+        Remove values from a mapping of column arrays based on the probabilities specified in var_dict.
+
+        Same as process_df, but works on the arrays before they are assembled into a table.
+
+        Args:
+            columns (Dict[str, Column]): The column arrays by concept ID.
+            var_dict (dict): A dictionary as described in process_df.
+            count (int): The number of rows of every column.
+            streams (RandomStreams, optional): The random streams to draw from. Defaults to numpy's global generator.
+            start (int, optional): The row number of the first row within the whole dataset. Defaults to 0.
+
+        Returns:
+            Dict[str, Column]: The same mapping with values removed according to the specified probabilities.
+
+        Raises:
+            ValueError: If the probability is non-zero for a non-nullable concept ID or if the probability is not between 0 and 1.
+        """
+        for concept_id, prob_missing in cls._removal_probabilities(var_dict):
+            draws = cls._draws(streams, concept_id, start, count)
+            columns[concept_id] = cls.process_array(columns[concept_id], prob_missing, draws)
+        return columns
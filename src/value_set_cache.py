@@ -0,0 +1,350 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+SNAPSHOT_VERSION = 1
+
+
+def default_snapshot_dir() -> str:
+    """
+    Get the default directory for value set snapshots.
+
+    Returns:
+        str: '$XDG_CACHE_HOME/cda-test-data-generator/value_sets', falling back to '~/.cache'.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'cda-test-data-generator', 'value_sets')
+
+
+class ValueSet:
+    """
+    A value set CSV stored column-wise as UTF-8 encoded byte arrays.
+
+    Columns are decoded to unicode arrays on first access and kept for later lookups.
+    """
+
+    def __init__(self, path: str, columns: List[str], encoded: Dict[str, np.ndarray]) -> None:
+        """
+        Initialize the ValueSet.
+
+        Args:
+            path (str): The resolved path of the source CSV file.
+            columns (List[str]): The column names in file order.
+            encoded (Dict[str, np.ndarray]): The UTF-8 encoded values per column, possibly memory-mapped.
+        """
+        self.path = path
+        self.columns = columns
+        self._encoded = encoded
+        self._decoded: Dict[str, np.ndarray] = {}
+        self._vocabularies: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._indexes: Dict[str, ValueSetIndex] = {}
+
+    def __len__(self) -> int:
+        return len(next(iter(self._encoded.values()))) if self._encoded else 0
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Get the number of bytes held by the value set, including decoded columns.
+
+        Returns:
+            int: The size in bytes.
+        """
+        return sum(array.nbytes for array in self._encoded.values()) + \
+            sum(array.nbytes for array in self._decoded.values()) + \
+            sum(categories.nbytes + codes.nbytes for categories, codes in self._vocabularies.values()) + \
+            sum(index.nbytes for index in self._indexes.values())
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Get a column as a unicode array. Missing values are represented as ''.
+
+        Args:
+            name (str): The column name.
+
+        Returns:
+            np.ndarray: The decoded column.
+
+        Raises:
+            ValueError: If the column does not exist in the value set.
+        """
+        if name not in self._encoded:
+            raise ValueError(f"Column '{name}' not found in file")
+        if name not in self._decoded:
+            self._decoded[name] = np.char.decode(self._encoded[name], 'utf-8')
+        return self._decoded[name]
+
+    def vocabulary(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the distinct values of a column and the code of every row, for storing sampled rows as categoricals.
+
+        Args:
+            name (str): The column name.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The sorted distinct values and the index of every row's value in them.
+
+        Raises:
+            ValueError: If the column does not exist in the value set.
+        """
+        if name not in self._vocabularies:
+            categories, codes = np.unique(self.column(name), return_inverse=True)
+            self._vocabularies[name] = (categories, codes.astype(np.int32))
+        return self._vocabularies[name]
+
+
+class ValueSetIndex:
+    """
+    A value set sorted by one key column, for looking up many keys at once.
+
+    If a key occurs in several rows, lookups return the last of them.
+    """
+
+    def __init__(self, value_set: ValueSet, key_column: str, order: np.ndarray) -> None:
+        """
+        Initialize the ValueSetIndex.
+
+        Args:
+            value_set (ValueSet): The indexed value set.
+            key_column (str): The key column.
+            order (np.ndarray): The row indices that stably sort the encoded key column, possibly memory-mapped.
+        """
+        self.value_set = value_set
+        self.key_column = key_column
+        self.order = order
+        self.sorted_keys = value_set._encoded[key_column][order]
+
+    @property
+    def nbytes(self) -> int:
+        return self.sorted_keys.nbytes
+
+    def rows(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Find the row of every key.
+
+        Args:
+            keys (np.ndarray): The keys to look up.
+
+        Returns:
+            np.ndarray: The row index of every key in the value set, -1 for keys that do not occur.
+        """
+        encoded = np.char.encode(np.asarray(keys, dtype=str), 'utf-8')
+        positions = np.searchsorted(self.sorted_keys, encoded, side='right') - 1
+        found = (positions >= 0) & (self.sorted_keys[np.maximum(positions, 0)] == encoded)
+        return np.where(found, self.order[np.maximum(positions, 0)], -1)
+
+    def lookup(self, keys: np.ndarray, value_column: str) -> np.ndarray:
+        """
+        Look up the value of a column for every key.
+
+        Args:
+            keys (np.ndarray): The keys to look up.
+            value_column (str): The column to return the values of.
+
+        Returns:
+            np.ndarray: The values as a unicode array, '' for keys that do not occur.
+
+        Raises:
+            ValueError: If the value column does not exist in the value set.
+        """
+        values = self.value_set.column(value_column)
+        rows = self.rows(keys)
+        if not len(values):
+            return np.full(len(rows), '', dtype=str)
+        return np.where(rows >= 0, values[np.maximum(rows, 0)], '')
+
+
+class ValueSetCache:
+    """
+    Process-wide cache of value set CSV files.
+
+    Entries are keyed by the resolved path plus the file's mtime and size and are evicted least recently used
+    once their total size exceeds max_bytes. Parsed files are persisted as .npy snapshots that later runs
+    memory-map instead of parsing the CSV again.
+    """
+
+    def __init__(self, snapshot_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """
+        Initialize the ValueSetCache.
+
+        Args:
+            snapshot_dir (str, optional): Directory for on-disk snapshots. Defaults to default_snapshot_dir().
+                                          Pass an empty string to disable snapshots.
+            max_bytes (int, optional): Upper bound for the in-memory size of cached value sets.
+        """
+        self.snapshot_dir = default_snapshot_dir() if snapshot_dir is None else snapshot_dir
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Tuple[str, int, int], ValueSet] = OrderedDict()
+
+    def configure(self, snapshot_dir: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        """
+        Change the snapshot directory or size bound and drop all in-memory entries.
+
+        Args:
+            snapshot_dir (str, optional): Directory for on-disk snapshots, '' disables snapshots.
+            max_bytes (int, optional): Upper bound for the in-memory size of cached value sets.
+        """
+        if snapshot_dir is not None:
+            self.snapshot_dir = snapshot_dir
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        self._entries.clear()
+
+    def get(self, path: str) -> ValueSet:
+        """
+        Get the value set for a CSV file, loading it from a snapshot or the CSV itself if necessary.
+
+        Args:
+            path (str): The path to the semicolon-separated CSV file.
+
+        Returns:
+            ValueSet: The cached value set.
+
+        Raises:
+            ValueError: If the file does not exist.
+        """
+        return self._get(self._key(path))
+
+    def index(self, path: str, key_column: str) -> ValueSetIndex:
+        """
+        Get the index of a value set CSV file by one of its columns.
+
+        The sort order is persisted next to the value set's snapshot, so it is built once per version of the file.
+
+        Args:
+            path (str): The path to the semicolon-separated CSV file.
+            key_column (str): The column to index.
+
+        Returns:
+            ValueSetIndex: The cached index.
+
+        Raises:
+            ValueError: If the file or the column does not exist.
+        """
+        key = self._key(path)
+        value_set = self._get(key)
+        if key_column not in value_set._indexes:
+            if key_column not in value_set.columns:
+                raise ValueError(f"Column '{key_column}' not found in file")
+            order = self._load_index(key, value_set, key_column)
+            if order is None:
+                order = np.argsort(value_set._encoded[key_column], kind='stable')
+                self._write_index(key, value_set, key_column, order)
+            value_set._indexes[key_column] = ValueSetIndex(value_set, key_column, order)
+            self._evict()
+        return value_set._indexes[key_column]
+
+    @staticmethod
+    def _key(path: str) -> Tuple[str, int, int]:
+        if not path or not os.path.isfile(path):
+            raise ValueError(f"File '{path}' does not exist.")
+        resolved = os.path.realpath(path)
+        stat = os.stat(resolved)
+        return resolved, stat.st_mtime_ns, stat.st_size
+
+    def _get(self, key: Tuple[str, int, int]) -> ValueSet:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        value_set = self._load_snapshot(key) or self._load_csv(key)
+        self._entries[key] = value_set
+        self._evict()
+        return value_set
+
+    def _evict(self) -> None:
+        total = sum(entry.nbytes for entry in self._entries.values())
+        while len(self._entries) > 1 and total > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.nbytes
+
+    def _snapshot_path(self, key: Tuple[str, int, int]) -> Tuple[str, str]:
+        resolved, mtime, size = key
+        path_hash = hashlib.sha1(resolved.encode('utf-8')).hexdigest()[:16]
+        version_hash = hashlib.sha1(f'{SNAPSHOT_VERSION}:{mtime}:{size}'.encode('utf-8')).hexdigest()[:16]
+        return path_hash, os.path.join(self.snapshot_dir, f'{path_hash}-{version_hash}')
+
+    def _load_snapshot(self, key: Tuple[str, int, int]) -> Optional[ValueSet]:
+        if not self.snapshot_dir:
+            return None
+        _, directory = self._snapshot_path(key)
+        try:
+            with open(os.path.join(directory, 'columns.json'), 'r', encoding='utf-8') as f:
+                columns = json.load(f)
+            encoded = {name: np.load(os.path.join(directory, f'{i}.npy'), mmap_mode='r')
+                       for i, name in enumerate(columns)}
+        except (OSError, ValueError):
+            return None
+        return ValueSet(key[0], columns, encoded)
+
+    def _load_csv(self, key: Tuple[str, int, int]) -> ValueSet:
+        df = pd.read_csv(key[0], delimiter=";", dtype=str, header=0).fillna('')
+        columns = [str(column) for column in df.columns]
+        encoded = {name: np.char.encode(df[name].to_numpy(dtype=str), 'utf-8') for name in columns}
+        value_set = ValueSet(key[0], columns, encoded)
+        if self.snapshot_dir:
+            try:
+                return self._write_snapshot(key, value_set) or value_set
+            except OSError as e:
+                logging.warning(f"Could not write value set snapshot for '{key[0]}': {str(e)}")
+        return value_set
+
+    def _write_snapshot(self, key: Tuple[str, int, int], value_set: ValueSet) -> Optional[ValueSet]:
+        path_hash, directory = self._snapshot_path(key)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'.{path_hash}-', dir=self.snapshot_dir)
+        try:
+            for i, name in enumerate(value_set.columns):
+                np.save(os.path.join(staging, f'{i}.npy'), value_set._encoded[name])
+            with open(os.path.join(staging, 'columns.json'), 'w', encoding='utf-8') as f:
+                json.dump(value_set.columns, f)
+            os.replace(staging, directory)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
+
+        # Drop snapshots of older versions of the same file
+        for name in os.listdir(self.snapshot_dir):
+            if name.startswith(f'{path_hash}-') and os.path.join(self.snapshot_dir, name) != directory:
+                shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
+        return self._load_snapshot(key)
+
+    def _index_path(self, key: Tuple[str, int, int], value_set: ValueSet, key_column: str) -> str:
+        _, directory = self._snapshot_path(key)
+        return os.path.join(directory, f'{value_set.columns.index(key_column)}.index.npy')
+
+    def _load_index(self, key: Tuple[str, int, int], value_set: ValueSet, key_column: str) -> Optional[np.ndarray]:
+        if not self.snapshot_dir:
+            return None
+        try:
+            order = np.load(self._index_path(key, value_set, key_column), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return order if order.shape == (len(value_set),) else None
+
+    def _write_index(self, key: Tuple[str, int, int], value_set: ValueSet, key_column: str,
+                     order: np.ndarray) -> None:
+        path = self._index_path(key, value_set, key_column)
+        if not self.snapshot_dir or not os.path.isdir(os.path.dirname(path)):
+            return
+        try:
+            fd, staging = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, order)
+            os.replace(staging, path)
+        except OSError as e:
+            logging.warning(f"Could not write value set index for '{key[0]}': {str(e)}")
+
+
+# Shared by all generators of the process
+value_set_cache = ValueSetCache()
@@ -0,0 +1,40 @@
+import os
+import sys
+from typing import List
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from calculate_dependencies import apply_dependencies  # noqa: E402
+from csv_to_cda import table_to_dict  # noqa: E402
+from dependency_rules import DEFAULT_RULES_PATH, RuleSet  # noqa: E402
+from generate_csv import generate_tables  # noqa: E402
+from value_set_cache import value_set_cache  # noqa: E402
+
+# Inputs of the tests, the short Excel template and the EmergencyNote stylesheet
+XLSX = os.path.join(ROOT, 'resources', 'CDAVariables_short.xlsx')
+XSLT = os.path.join(ROOT, 'resources', 'EmergencyNote.xslt')
+
+
+@pytest.fixture(autouse=True, scope='session')
+def snapshot_dir(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """
+    Keep the value set snapshots of the tests out of the user's cache directory.
+    """
+    path = str(tmp_path_factory.mktemp('value_sets'))
+    value_set_cache.configure(snapshot_dir=path)
+    return path
+
+
+def generate_rows(number: int, seed: int) -> List[dict]:
+    """
+    Generate rows of the short template with the dependency rules applied, as the pipeline transforms them.
+    """
+    rules = RuleSet.from_file(DEFAULT_RULES_PATH)
+    rows = []
+    for _, table in generate_tables(XLSX, number, seed, chunk_size=64):
+        apply_dependencies(table, rules)
+        rows += table_to_dict(table)
+    return rows
@@ -0,0 +1,93 @@
+"""
+A local stand-in for the DWH import endpoint, to try out and test the HTTP sink.
+
+Accepts CDA documents posted to any path and answers 201, or with a temporary error for a share of the requests
+to exercise the retries of the sink. Received documents can be stored, and the counts are logged on shutdown.
+
+Usage:
+    python tests/stub_import_server.py [--host 127.0.0.1] [--port 8080] [--store <dir>] [--fail-rate 0.1]
+        [--delay 0.01] [--seed 0]
+    python src/main.py ... --sink http --http-url http://127.0.0.1:8080/aktin/cda/fhir/Binary
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+from typing import Optional
+
+from aiohttp import web
+
+
+class StubImportServer:
+    """
+    Counts, optionally stores and randomly rejects the posted documents.
+    """
+
+    def __init__(self, store_dir: Optional[str] = None, fail_rate: float = 0.0, delay: float = 0.0,
+                 seed: Optional[int] = None) -> None:
+        """
+        Initialize the StubImportServer.
+
+        Args:
+            store_dir (str, optional): Directory to store the accepted documents in as 'received_{n}.xml'.
+            fail_rate (float, optional): Share of requests answered with 503. Defaults to 0.
+            delay (float, optional): Seconds every request takes, to simulate a busy server. Defaults to 0.
+            seed (int, optional): Seed for choosing the rejected requests.
+        """
+        self.store_dir = store_dir
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.accepted = 0
+        self.rejected = 0
+        self._rng = random.Random(seed)
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self._rng.random() < self.fail_rate:
+            self.rejected += 1
+            return web.Response(status=503, text='Temporarily unavailable')
+        self.accepted += 1
+        if self.store_dir:
+            with open(os.path.join(self.store_dir, f'received_{self.accepted}.xml'), 'wb') as f:
+                f.write(body)
+        return web.Response(status=201)
+
+    def create_app(self) -> web.Application:
+        """
+        Create the web application routing every POST and PUT to the handler.
+
+        Returns:
+            aiohttp.web.Application: The application.
+        """
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route('POST', '/{path:.*}', self.handle)
+        app.router.add_route('PUT', '/{path:.*}', self.handle)
+        app.on_shutdown.append(self._log_counts)
+        return app
+
+    async def _log_counts(self, app: web.Application) -> None:
+        logging.info(f"Accepted {self.accepted} documents, rejected {self.rejected} requests.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Stub DWH import endpoint for the HTTP sink.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on.')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on.')
+    parser.add_argument('--store', type=str, default=None, help='Directory to store the accepted documents in.')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with 503.')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds every request takes.')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for choosing the rejected requests.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = StubImportServer(args.store, args.fail_rate, args.delay, args.seed)
+    web.run_app(server.create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+from lxml import etree
+
+from cda_template import CompiledTemplate
+from conftest import XSLT, generate_rows
+from csv_to_cda import load_xslt, render_cda
+
+ROWS = 100
+# Values the generator rarely produces: empty and whitespace-only values, characters that need escaping and codes
+# the template tests for
+EDGE_CASES = ['', ' ', ' \n\t ', 'OTH', 'PB', 'OPB', 'FAMDEP', '0', 'true', '&<>"\'', 'a\tb\r\nc', ' x ',
+              'Ärztin Öz-Weiß € 😀', '{score}', ']]>']
+# Fraction of the fields of a row replaced by an edge case, and of those dropped from the row instead
+EDGE_CASE_RATE = 0.2
+MISSING_RATE = 0.1
+
+
+@pytest.fixture(scope='module')
+def xslt_transform() -> etree.XSLT:
+    return load_xslt(XSLT)
+
+
+@pytest.fixture(scope='module')
+def template() -> CompiledTemplate:
+    return CompiledTemplate.from_file(XSLT)
+
+
+def with_edge_cases(row: dict, rng: random.Random) -> dict:
+    variant = {}
+    for field, value in row.items():
+        if rng.random() < EDGE_CASE_RATE:
+            if rng.random() < MISSING_RATE:
+                continue
+            value = rng.choice(EDGE_CASES)
+        variant[field] = value
+    return variant
+
+
+@pytest.mark.parametrize('pretty_print', [True, False])
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_compiled_template_renders_the_same_documents(xslt_transform, template, seed, pretty_print) -> None:
+    rows = generate_rows(ROWS, seed)
+    rng = random.Random(seed)
+    rows += [with_edge_cases(row, rng) for row in rows]
+
+    for i, row in enumerate(rows):
+        expected = etree.tostring(render_cda(row, xslt_transform), pretty_print=pretty_print, encoding='UTF-8')
+        assert template.render(row, pretty_print) == expected, f'Row {i} differs'
@@ -0,0 +1,57 @@
+import os
+from typing import Dict, Iterator
+
+import pytest
+
+import main
+from checkpoints import CHECKPOINT, CheckpointingSink
+from config import Config
+from conftest import XLSX, XSLT
+
+NUMBER = 500
+CHUNK_SIZE = 64
+# Number of documents after which the first run is interrupted, in the middle of a chunk
+INTERRUPT_AFTER = 230
+
+
+def run(output: str, resume: bool = False) -> None:
+    main.process_excel_to_cda(Config(number=NUMBER, cleanup=False, xlsx=XLSX, xslt=XSLT, output=output, seed=7,
+                                     chunk_size=CHUNK_SIZE, layout='index', fanout=16, manifest=True,
+                                     checkpoint_every=2, resume=resume))
+
+
+def read_tree(directory: str) -> Dict[str, bytes]:
+    files = {}
+    for path, _, names in os.walk(directory):
+        for name in names:
+            if name != CHECKPOINT:
+                with open(os.path.join(path, name), 'rb') as f:
+                    files[os.path.relpath(os.path.join(path, name), directory)] = f.read()
+    return files
+
+
+@pytest.mark.parametrize('killed', [False, True])
+def test_resumed_run_writes_the_same_output(tmp_path, monkeypatch, killed) -> None:
+    uninterrupted = str(tmp_path / 'uninterrupted')
+    run(uninterrupted)
+
+    transform_rows = main.transform_rows
+
+    def interrupted(*args, **kwargs) -> Iterator:
+        for i, document in enumerate(transform_rows(*args, **kwargs), start=1):
+            if i > INTERRUPT_AFTER:
+                raise KeyboardInterrupt
+            yield document
+
+    with monkeypatch.context() as patch:
+        patch.setattr(main, 'transform_rows', interrupted)
+        if killed:
+            # Without the last checkpoint, the documents after the previous one are written again
+            patch.setattr(CheckpointingSink, 'close', lambda sink: sink.sink.close())
+        resumed = str(tmp_path / 'resumed')
+        with pytest.raises(KeyboardInterrupt):
+            run(resumed)
+    assert len(read_tree(resumed)) < len(read_tree(uninterrupted))
+
+    run(resumed, resume=True)
+    assert read_tree(resumed) == read_tree(uninterrupted)
@@ -0,0 +1,16 @@
+from typing import List
+
+from conftest import XSLT, generate_rows
+from csv_to_cda import serialize_document, transform_rows
+
+NUMBER = 200
+SEED = 11
+
+
+def transform(rows: List[dict], workers: int) -> List[bytes]:
+    return [serialize_document(document) for document in transform_rows(rows, XSLT, workers, batch_size=16)]
+
+
+def test_transform_workers_do_not_change_the_documents() -> None:
+    rows = generate_rows(NUMBER, SEED)
+    assert transform(rows, workers=2) == transform(rows, workers=1)
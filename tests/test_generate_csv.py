@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pandas as pd
+
+import generator
+from conftest import XLSX
+from generate_csv import generate_tables
+
+NUMBER = 300
+SEED = 7
+
+
+def generate(**kwargs) -> pd.DataFrame:
+    options = {'seed': SEED, 'chunk_size': 128, **kwargs}
+    return pd.concat([table for _, table in generate_tables(XLSX, NUMBER, **options)], ignore_index=True)
+
+
+def test_workers_do_not_change_the_table() -> None:
+    pd.testing.assert_frame_equal(generate(workers=1), generate(workers=2))
+
+
+def test_chunk_size_does_not_change_the_table() -> None:
+    pd.testing.assert_frame_equal(generate(chunk_size=64), generate(chunk_size=1000))
+
+
+def test_same_seed_generates_same_table() -> None:
+    pd.testing.assert_frame_equal(generate(), generate())
+
+
+def test_same_seed_generates_same_table_on_another_day(monkeypatch) -> None:
+    first = generate()
+
+    class Tomorrow(datetime):
+        @classmethod
+        def today(cls) -> datetime:
+            return datetime.today().replace(year=datetime.today().year + 1)
+
+    monkeypatch.setattr(generator, 'datetime', Tomorrow)
+    pd.testing.assert_frame_equal(first, generate())
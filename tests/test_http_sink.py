@@ -0,0 +1,144 @@
+"""
+Tests of the HTTP sink against the stub import server.
+
+Run with:
+    python -m pytest tests
+"""
+import asyncio
+import csv
+import os
+import random
+import tempfile
+import threading
+import unittest
+
+from aiohttp import web
+
+from http_sink import HttpSink
+from stub_import_server import StubImportServer
+
+DOCUMENTS = 40
+FAIL_RATE = 0.3
+SEED = 3
+
+
+class StubServerThread:
+    """
+    Runs the stub import server on an ephemeral port in a background thread.
+    """
+
+    def __init__(self, server: StubImportServer) -> None:
+        self.server = server
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def start(self) -> str:
+        self._thread.start()
+        port = asyncio.run_coroutine_threadsafe(self._start_site(), self._loop).result()
+        return f'http://127.0.0.1:{port}/aktin/cda/fhir/Binary'
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _start_site(self) -> int:
+        self._runner = web.AppRunner(self.server.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        return self._runner.addresses[0][1]
+
+
+def expected_outcomes(retries: int) -> list:
+    """
+    Replay the rejections of the stub server for documents posted one after the other.
+
+    Returns:
+        list: The result, status and attempts of every document.
+    """
+    rng = random.Random(SEED)
+    outcomes = []
+    for _ in range(DOCUMENTS):
+        for attempt in range(1, retries + 2):
+            if rng.random() >= FAIL_RATE:
+                outcomes.append(('delivered', '201', str(attempt)))
+                break
+        else:
+            outcomes.append(('failed', '503', str(retries + 1)))
+    return outcomes
+
+
+class HttpSinkTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = os.path.join(self.directory.name, 'received')
+        self.manifest = os.path.join(self.directory.name, 'http_manifest.csv')
+        self.server = StubImportServer(self.store, fail_rate=FAIL_RATE, seed=SEED)
+        self.stub = StubServerThread(self.server)
+        self.url = self.stub.start()
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+        self.directory.cleanup()
+
+    def deliver(self, retries: int, max_failures: int = 0) -> HttpSink:
+        # One request at a time, so that the server rejects the same requests in every run
+        sink = HttpSink(self.url, self.manifest, concurrency=1, retries=retries, backoff=0.0,
+                        max_failures=max_failures)
+        try:
+            for index in range(1, DOCUMENTS + 1):
+                sink.write(index, f'<ClinicalDocument id="{index}"/>'.encode())
+        finally:
+            sink.close()
+        return sink
+
+    def read_manifest(self) -> list:
+        with open(self.manifest, newline='', encoding='UTF-8') as f:
+            return list(csv.DictReader(f))
+
+    def test_retries_rejected_requests(self) -> None:
+        expected = expected_outcomes(retries=5)
+        sink = self.deliver(retries=5)
+
+        self.assertEqual(sink.delivered, DOCUMENTS)
+        self.assertEqual(sink.failed, 0)
+        self.assertEqual(self.server.accepted, DOCUMENTS)
+        self.assertEqual(self.server.rejected, sum(int(attempts) - 1 for _, _, attempts in expected))
+        manifest = self.read_manifest()
+        self.assertEqual([row['index'] for row in manifest], [str(index) for index in range(1, DOCUMENTS + 1)])
+        self.assertEqual([(row['result'], row['status'], row['attempts']) for row in manifest], expected)
+        self.assertEqual(len(os.listdir(self.store)), DOCUMENTS)
+
+    def test_fails_when_too_many_documents_fail(self) -> None:
+        expected = expected_outcomes(retries=0)
+        failed = sum(result == 'failed' for result, _, _ in expected)
+        self.assertGreater(failed, 0)
+
+        with self.assertRaisesRegex(RuntimeError, f'{failed} CDA documents could not be delivered'):
+            self.deliver(retries=0)
+        manifest = self.read_manifest()
+        self.assertEqual([(row['result'], row['status'], row['attempts']) for row in manifest], expected)
+        self.assertEqual(self.server.accepted, DOCUMENTS - failed)
+
+        # The server continues its random rejections, so only the threshold is checked
+        sink = self.deliver(retries=0, max_failures=DOCUMENTS)
+        self.assertGreater(sink.failed, 0)
+        self.assertEqual(sink.delivered + sink.failed, DOCUMENTS)
+
+    def test_stops_when_the_endpoint_is_unreachable(self) -> None:
+        # A port that was just free again
+        closed = StubServerThread(StubImportServer())
+        url = closed.start()
+        closed.stop()
+
+        sink = HttpSink(url, self.manifest, concurrency=2, retries=1, backoff=0.0)
+        with self.assertRaisesRegex(RuntimeError, 'None of the first 2 CDA documents reached'):
+            for index in range(1, DOCUMENTS + 1):
+                sink.write(index, b'<ClinicalDocument/>')
+        with self.assertRaises(RuntimeError):
+            sink.close()
+        self.assertEqual(sink.delivered, 0)
+        self.assertLess(len(self.read_manifest()), DOCUMENTS)